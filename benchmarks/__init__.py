@@ -0,0 +1,5 @@
+"""
+Benchmark harness for the recommend path: synthetic catalogs and score matrices
+(synthetic.py), the runner (run.py) and a result comparison tool (compare.py), plus
+checks for import times (import_budget.py) and the response contract (contract.py).
+"""
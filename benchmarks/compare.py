@@ -0,0 +1,70 @@
+"""
+Compares two benchmark result files written by benchmarks.run.
+
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.1]
+
+Prints every metric of every (stage, catalog size) present in both, with the
+relative change, and exits with status 1 if any of them regressed by more than the
+threshold (higher latency, startup or RSS; lower throughput).
+"""
+import argparse
+import json
+import sys
+
+# (label, path into a result, True if higher is better)
+METRICS = [
+    ("throughput_rps", ("throughput_rps",), True),
+    ("p50_ms", ("latency_ms", "p50"), False),
+    ("p95_ms", ("latency_ms", "p95"), False),
+    ("p99_ms", ("latency_ms", "p99"), False),
+    ("startup_s", ("startup_seconds",), False),
+    ("peak_rss_mb", ("peak_rss_mb",), False),
+]
+
+
+def _load(path) -> dict:
+    with open(path) as f:
+        report = json.load(f)
+    return {(r['stage'], r['outfits']): r for r in report['results'] if "error" not in r}
+
+
+def _get(result, path):
+    for key in path:
+        result = result[key]
+    return result
+
+
+def compare(baseline: dict, candidate: dict, threshold: float = 0.1) -> list:
+    """
+    Rows of (stage, outfits, metric, old, new, relative change, regressed) for every
+    case in both result sets.
+    """
+    rows = []
+    for case in sorted(baseline.keys() & candidate.keys(), key=lambda c: (c[0], c[1] or 0)):
+        for label, path, higher_is_better in METRICS:
+            old, new = _get(baseline[case], path), _get(candidate[case], path)
+            change = (new - old) / old if old else 0.0
+            regressed = -change > threshold if higher_is_better else change > threshold
+            rows.append((case[0], case[1], label, old, new, change, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    rows = compare(_load(args.baseline), _load(args.candidate), args.threshold)
+    if not rows:
+        print("No (stage, catalog size) cases in common", file=sys.stderr)
+    for stage, outfits, label, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{stage:<24} {outfits or '-':>8} {label:<15} {old:>12.3f} {new:>12.3f} {change:>+8.1%}{flag}")
+    if any(row[-1] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Checks that pre-rendered responses are byte-compatible with the response models.
+
+    python -m benchmarks.contract [--outfits 2000] [--requests 200]
+
+Serves the same recommendation results twice from a scratch FastAPI app: once as
+main's response models, encoded by FastAPI through `response_model` (the schema
+contract), and once rendered by outfit_recommender.rendering. Compares the bodies
+byte for byte for /recommend, /recommend/batch and /recommend/pages responses and
+NDJSON stream lines, on synthetic recommendations plus outfits with awkward
+strings. Exits with status 1 on any difference and prints the time each way
+takes per response.
+"""
+import argparse
+import json
+import sys
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from benchmarks.synthetic import request_mix, synthetic_catalog, synthetic_score_maps
+from outfit_recommender.catalog import Outfit
+from outfit_recommender.rendering import outfit_json, recommendations_json, batch_json, page_json
+
+# Labels and URLs JSON must escape (or must not), plus odd scores
+AWKWARD_STRINGS = [
+    "", 'quo"te', "back\\slash", "new\nline\ttab\r", "\x00\x01\x1f\x7f", "WOMEN-\u00e9\u2713-id_1.jpg",
+    "emoji-\U0001f457.jpg", "sep\u2028\u2029", "</script>", "MEN-" + "x" * 300, "\ud7ff\uffff",
+]
+AWKWARD_SCORES = [0.0, -0.4, -3.7, 0.99, 12.5, 1e6, -1e6]
+
+
+def _model_outfit(main, result):
+    # How main built every response before rendering.py
+    return main.OutfitResponse(
+        gender=result['outfit'].gender,
+        image_label=result['outfit'].image_label,
+        image_url=result['outfit'].image_url,
+        attributes=result['outfit'].attributes(),
+        total_score=int(result['score']),
+        style_score=int(result['style_score']),
+        bodyshape_score=int(result['bodyshape_score'])
+    )
+
+
+def _model_recommendations(main, results):
+    return main.RecommendationResponse(recommendations=[_model_outfit(main, result) for result in results])
+
+
+def contract_app(main, cases: list) -> FastAPI:
+    """App serving `cases` (lists of results) at /model/... and /rendered/... routes."""
+    app = FastAPI()
+
+    @app.get("/model/recommend/{i}", response_model=main.RecommendationResponse)
+    def model_recommend(i: int):
+        return _model_recommendations(main, cases[i])
+
+    @app.get("/rendered/recommend/{i}", response_model=main.RecommendationResponse)
+    def rendered_recommend(i: int):
+        return Response(recommendations_json(cases[i]), media_type="application/json")
+
+    @app.get("/model/batch", response_model=main.BatchRecommendationResponse)
+    def model_batch():
+        return main.BatchRecommendationResponse(results=[_model_recommendations(main, results) for results in cases])
+
+    @app.get("/rendered/batch", response_model=main.BatchRecommendationResponse)
+    def rendered_batch():
+        return Response(batch_json(cases), media_type="application/json")
+
+    @app.get("/model/page/{i}", response_model=main.RecommendationPage)
+    def model_page(i: int, cursor: str = None):
+        results = cases[i]
+        return main.RecommendationPage(
+            recommendations=[_model_outfit(main, result) for result in results], total=len(results) * 3, next_cursor=cursor,
+        )
+
+    @app.get("/rendered/page/{i}", response_model=main.RecommendationPage)
+    def rendered_page(i: int, cursor: str = None):
+        results = cases[i]
+        return Response(page_json(results, len(results) * 3, cursor), media_type="application/json")
+
+    return app
+
+
+def _cases(outfits: int, requests: int, seed: int) -> list:
+    from outfit_recommender.recommender import recommend_request
+    from outfit_recommender.serving import ServingState
+    style_map, bodyshape_map = synthetic_score_maps(seed)
+    state = ServingState(1, style_map, bodyshape_map, synthetic_catalog(outfits, seed))
+    cases = [
+        recommend_request(state.engine, state.tables, state.index, dict(request, topk=10))
+        for request in request_mix(requests, seed)
+    ]
+    codes = state.outfits[0].codes
+    awkward = []
+    for i, text in enumerate(AWKWARD_STRINGS):
+        outfit = Outfit(codes, text, text[::-1], ("male", "female", "unisex")[i % 3])
+        score = AWKWARD_SCORES[i % len(AWKWARD_SCORES)]
+        awkward.append({'outfit': outfit, 'score': score, 'style_score': -score, 'bodyshape_score': score / 3})
+    return cases + [awkward, []]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check pre-rendered responses against the response models.")
+    parser.add_argument("--outfits", type=int, default=2000, help="synthetic catalog size (default %(default)s)")
+    parser.add_argument("--requests", type=int, default=200, help="recommendation result sets checked (default %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    import main as api
+    cases = _cases(args.outfits, args.requests, args.seed)
+    client = TestClient(contract_app(api, cases))
+    failures = []
+
+    def check(name, model_path, rendered_path):
+        model, rendered = client.get(model_path), client.get(rendered_path)
+        if (model.status_code, model.content) != (rendered.status_code, rendered.content):
+            failures.append(name)
+            if len(failures) <= 5:
+                print(f"FAIL {name}\n  model:    {model.content[:300]!r}\n  rendered: {rendered.content[:300]!r}")
+
+    for i in range(len(cases)):
+        check(f"recommend {i}", f"/model/recommend/{i}", f"/rendered/recommend/{i}")
+        check(f"page {i}", f"/model/page/{i}", f"/rendered/page/{i}")
+    check("page with cursor", "/model/page/0?cursor=ab12.10.10", "/rendered/page/0?cursor=ab12.10.10")
+    check("batch", "/model/batch", "/rendered/batch")
+    # Stream lines used to be each OutfitResponse's model_dump_json()
+    for i, results in enumerate(cases):
+        for result in results:
+            if _model_outfit(api, result).model_dump_json() != outfit_json(result):
+                failures.append(f"stream line {i}")
+                break
+    # Every rendered body must also parse back to the same data
+    for i, results in enumerate(cases):
+        if json.loads(recommendations_json(results)) != _model_recommendations(api, results).model_dump():
+            failures.append(f"decoded {i}")
+
+    def model_body(results):
+        # Model construction, then what FastAPI does with a response_model
+        content = api.RecommendationResponse.model_validate(_model_recommendations(api, results)).model_dump(mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    for name, render, path in (
+        ("model", model_body, "/model/recommend/{}"),
+        ("rendered", lambda results: recommendations_json(results).encode(), "/rendered/recommend/{}"),
+    ):
+        start = time.perf_counter()
+        for results in cases:
+            render(results)
+        serialize = (time.perf_counter() - start) / len(cases) * 1000
+        start = time.perf_counter()
+        for i in range(len(cases)):
+            client.get(path.format(i))
+        served = (time.perf_counter() - start) / len(cases) * 1000
+        print(f"{name:<9} serialize {serialize:.3f} ms, served through TestClient {served:.3f} ms (per 10-outfit response)")
+    checks = 4 * len(cases) + 2
+    print(f"{len(failures)} of {checks} checks failed" if failures else f"ok: {checks} checks")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
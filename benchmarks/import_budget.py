@@ -0,0 +1,64 @@
+"""
+Import-time budget check for the package entry points.
+
+    python -m benchmarks.import_budget [--runs 3]
+
+Imports each entry point in a fresh interpreter under `python -X importtime` and
+fails (exit status 1) when its cumulative import time, best of `--runs`, exceeds
+its budget, or when it pulls in a module that must only be loaded on first use.
+"""
+import argparse
+import subprocess
+import sys
+
+# Entry point -> cumulative import time budget in milliseconds
+BUDGETS_MS = {
+    "outfit_recommender.recommender": 300,
+    "outfit_recommender.workers": 400,
+    "outfit_recommender.__main__": 400,
+    "main": 1500,
+}
+
+# Loaded lazily (spaCy for the NER fallback, HTTP clients for remote sources) or not
+# used at all; none of them may be imported by the entry points
+LAZY_MODULES = ("spacy", "thinc", "httpx", "requests", "pandas", "sklearn")
+
+
+def measure(module: str) -> tuple:
+    """(cumulative import time in ms, names of every module imported) for one fresh import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True,
+    )
+    total_us = None
+    imported = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        imported.add(name)
+        if name == module:
+            total_us = int(cumulative)
+    return total_us / 1000, imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check import times of the package entry points.")
+    parser.add_argument("--runs", type=int, default=3, help="imports per entry point; the fastest counts (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        runs = [measure(module) for _ in range(args.runs)]
+        best = min(ms for ms, _ in runs)
+        eager = sorted({name.split(".")[0] for _, imported in runs for name in imported} & set(LAZY_MODULES))
+        ok = best <= budget and not eager
+        failed |= not ok
+        note = f"  imports {', '.join(eager)}" if eager else ""
+        print(f"{'ok  ' if ok else 'FAIL'} {module:<32} {best:8.1f} ms (budget {budget} ms){note}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Benchmarks the recommend path on synthetic catalogs.
+
+    python -m benchmarks.run --sizes 1000,100000,1000000 --output results.json
+
+Stages:
+  parse_prompt             parse_prompt on the prompt mix (uncached); startup is the spaCy model load
+  recommend_best_combined  full-catalog scoring of the gender's rows; startup builds the engine and index
+  recommend_request        the served path with precomputed tables; startup builds a ServingState
+  api                      POST /recommend through the FastAPI app; startup is app start until /ready
+
+Every (stage, catalog size) runs in a fresh process, so startup time and peak RSS
+are its own. Results are written as JSON (see benchmarks.compare to diff two runs).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+STAGES = ("parse_prompt", "recommend_best_combined", "recommend_request", "api")
+DEFAULT_SIZES = "1000,10000,100000"
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _setup_parse_prompt(size, seed, options):
+    from outfit_recommender.nlp_prompt_parser import get_nlp, parse_prompt
+    start = time.perf_counter()
+    get_nlp()
+    startup = time.perf_counter() - start
+    return startup, lambda request: parse_prompt(request['prompt'])
+
+
+def _setup_recommend_best_combined(size, seed, options):
+    from benchmarks.synthetic import synthetic_catalog, synthetic_score_maps
+    from outfit_recommender.engine import ScoreEngine
+    from outfit_recommender.index import AttributeIndex
+    from outfit_recommender.recommender import recommend_best_combined
+    catalog = synthetic_catalog(size, seed)
+    style_map, bodyshape_map = synthetic_score_maps(seed)
+    start = time.perf_counter()
+    engine = ScoreEngine(catalog, style_map, bodyshape_map)
+    index = AttributeIndex(catalog)
+    startup = time.perf_counter() - start
+
+    def run(request):
+        return recommend_best_combined(
+            catalog, request['prompt'], None, None,
+            topk=request['topk'], body_shape=request['body_shape'], engine=engine,
+            rows=index.rows(gender=request['gender']), index=index, feature_mode=request['feature_mode'],
+        )
+    return startup, run
+
+
+def _setup_recommend_request(size, seed, options):
+    from benchmarks.synthetic import synthetic_catalog, synthetic_score_maps
+    from outfit_recommender.recommender import recommend_request
+    from outfit_recommender.serving import ServingState
+    catalog = synthetic_catalog(size, seed)
+    style_map, bodyshape_map = synthetic_score_maps(seed)
+    start = time.perf_counter()
+    state = ServingState(1, style_map, bodyshape_map, catalog)
+    startup = time.perf_counter() - start
+    return startup, lambda request: recommend_request(state.engine, state.tables, state.index, request)
+
+
+def _setup_api(size, seed, options):
+    from benchmarks.synthetic import write_sources
+    directory = tempfile.mkdtemp(prefix="outfit-bench-")
+    paths = write_sources(directory, size, seed)
+    # main reads its configuration at import time
+    os.environ.update(
+        STYLE_SCORE_CSV_URL=paths['style'],
+        BODYSHAPE_SCORE_CSV_URL=paths['bodyshape'],
+        OUTFIT_DATASET_CSV_URL=paths['outfits'],
+        OUTFIT_SCORING_WORKERS=str(options['api_workers']),
+        OUTFIT_RESULT_CACHE_SIZE="4096" if options['result_cache'] else "0",
+    )
+    os.environ.pop("OUTFIT_CACHE_DIR", None)
+    from fastapi.testclient import TestClient
+    import main
+
+    start = time.perf_counter()
+    client = TestClient(main.app)
+    client.__enter__()
+    while True:
+        ready = client.get("/ready")
+        if ready.status_code == 200:
+            break
+        if ready.json()['status'] == "failed":
+            raise RuntimeError(f"App failed to load: {ready.json()['error']}")
+        time.sleep(0.01)
+    startup = time.perf_counter() - start
+    # Everything is in memory once ready (no snapshot cache)
+    shutil.rmtree(directory, ignore_errors=True)
+
+    def run(request):
+        response = client.post("/recommend", json=request)
+        response.raise_for_status()
+        return response
+    return startup, run
+
+
+_SETUPS = {
+    "parse_prompt": _setup_parse_prompt,
+    "recommend_best_combined": _setup_recommend_best_combined,
+    "recommend_request": _setup_recommend_request,
+    "api": _setup_api,
+}
+
+
+def _run_case(stage, size, options):
+    # Runs in its own process; see run_benchmarks()
+    from benchmarks.synthetic import request_mix
+    requests = request_mix(options['requests'], options['seed'])
+    startup, fn = _SETUPS[stage](size, options['seed'], options)
+    # Warm-up fills the prompt cache and lazily built tables; prompt parsing is
+    # measured by its own stage
+    for request in requests[:options['warmup']]:
+        fn(request)
+    latencies = []
+    start = time.perf_counter()
+    for request in requests:
+        t = time.perf_counter()
+        fn(request)
+        latencies.append(time.perf_counter() - t)
+        if t - start > options['max_seconds']:
+            break
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]).tolist()
+    return {
+        "stage": stage,
+        "outfits": size,
+        "requests": len(latencies),
+        "startup_seconds": startup,
+        "throughput_rps": len(latencies) / elapsed,
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()), "p50": p50, "p95": p95, "p99": p99,
+            "max": float(latencies_ms.max()),
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def run_benchmarks(stages, sizes, options) -> list:
+    """Runs every stage at every catalog size (parse_prompt once) and returns the results."""
+    results = []
+    for stage in stages:
+        for size in ([None] if stage == "parse_prompt" else sizes):
+            print(f"{stage} ({size or '-'} outfits)...", file=sys.stderr, flush=True)
+            # A fresh spawned process per case keeps startup and peak RSS separate
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as ex:
+                try:
+                    result = ex.submit(_run_case, stage, size, options).result()
+                except Exception as e:
+                    result = {"stage": stage, "outfits": size, "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            print("  " + _summary(result), file=sys.stderr, flush=True)
+    return results
+
+
+def _summary(result) -> str:
+    if "error" in result:
+        return f"failed: {result['error']}"
+    latency = result['latency_ms']
+    return (
+        f"{result['throughput_rps']:.1f} req/s, p50 {latency['p50']:.2f} ms, p95 {latency['p95']:.2f} ms, "
+        f"p99 {latency['p99']:.2f} ms, startup {result['startup_seconds']:.2f} s, peak RSS {result['peak_rss_mb']:.0f} MB"
+    )
+
+
+def _environment() -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the outfit recommend path on synthetic catalogs.")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of: " + ", ".join(STAGES))
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated catalog sizes (default %(default)s)")
+    parser.add_argument("--requests", type=int, default=1000, help="requests replayed per case (default %(default)s)")
+    parser.add_argument("--warmup", type=int, default=50, help="untimed requests first (default %(default)s)")
+    parser.add_argument("--max-seconds", type=float, default=30, help="stop a case early after this long (default %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--api-workers", type=int, default=0, help="OUTFIT_SCORING_WORKERS for the api stage (default %(default)s)")
+    parser.add_argument("--result-cache", action="store_true", help="keep the api result cache on (off by default, so every request is scored)")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    sizes = [int(float(s)) for s in args.sizes.split(",") if s]
+    options = {
+        "requests": args.requests, "warmup": args.warmup, "max_seconds": args.max_seconds, "seed": args.seed,
+        "api_workers": args.api_workers, "result_cache": args.result_cache,
+    }
+    report = {
+        "environment": _environment(),
+        "options": dict(options, stages=stages, sizes=sizes),
+        "results": run_benchmarks(stages, sizes, options),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
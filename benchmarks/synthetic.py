@@ -0,0 +1,136 @@
+"""
+Synthetic data for benchmarks: outfit catalogs and score matrices of any size drawn
+from ATTRIBUTE_CODE_MAPS, and a request stream replaying a weighted prompt mix.
+Everything is seeded, so two runs (or two versions of the code) see the same data.
+"""
+import csv
+import os
+import random
+from collections import defaultdict
+
+import numpy as np
+
+from outfit_recommender.attribute_mapping import ATTRIBUTE_CODE_MAPS, STYLE_NAMES, BODYSHAPE_NAMES
+from outfit_recommender.catalog import Catalog, ATTRIBUTE_NAMES, ATTRIBUTE_SIZES, NA_CODES
+from outfit_recommender.snapshot import pack_strings
+
+# Share of attribute values left unknown ("NA"), as in the real dataset
+NA_RATE = 0.05
+# Label prefixes decide the gender (see infer_gender_from_label), with their shares
+LABEL_PREFIXES = (("MEN", 0.4), ("WOMEN", 0.5), ("UNISEX", 0.1))
+
+# (prompt, weight): mostly short keyword prompts, some without an occasion keyword
+# (those fall back to spaCy NER), and a few that filter on features
+PROMPT_MIX = [
+    ("I want a formal outfit for a summer wedding, prefer short sleeves and cotton", 8),
+    ("casual outfit for a picnic", 10),
+    ("something trendy for a date night", 8),
+    ("elegant winter party look with long sleeves", 6),
+    ("minimalist office outfit for work", 8),
+    ("streetwear for the gym", 5),
+    ("bohemian floral dress for spring holiday", 5),
+    ("what should I wear for a job interview in fall", 6),
+    ("denim and leather, striped pattern", 4),
+    ("comfortable clothes for a rainy day", 4),
+    ("cute outfit for my cousin's graduation", 3),
+    ("I need something to wear to Coachella", 2),
+    ("show me outfits", 3),
+    ("Formal", 2),
+]
+
+
+def synthetic_codes(n: int, seed: int = 0) -> np.ndarray:
+    """(n x attributes) uint8 code matrix with uniform values and NA_RATE unknowns."""
+    rng = np.random.default_rng(seed)
+    codes = np.empty((n, len(ATTRIBUTE_NAMES)), dtype=np.uint8)
+    for col, size in enumerate(ATTRIBUTE_SIZES.tolist()):
+        na = int(NA_CODES[col])
+        known = np.array([code for code in range(size) if code != na], dtype=np.uint8)
+        values = known[rng.integers(0, len(known), n)]
+        values[rng.random(n) < NA_RATE] = na
+        codes[:, col] = values
+    return codes
+
+
+def synthetic_labels(n: int, seed: int = 0) -> list:
+    """Image labels in the dataset's naming scheme, with LABEL_PREFIXES genders."""
+    rng = np.random.default_rng(seed + 1)
+    prefixes = [prefix for prefix, _ in LABEL_PREFIXES]
+    choice = rng.choice(len(prefixes), n, p=[share for _, share in LABEL_PREFIXES])
+    return [f"{prefixes[p]}-Synthetic-id_{i:08d}-01_1_front.jpg" for i, p in enumerate(choice.tolist())]
+
+
+def synthetic_catalog(n: int, seed: int = 0) -> Catalog:
+    """Catalog of `n` synthetic outfits, built straight from arrays."""
+    labels = synthetic_labels(n, seed)
+    label_blob, label_offsets = pack_strings(labels)
+    url_blob, url_offsets = pack_strings([f"https://example.com/images/{label}" for label in labels])
+    return Catalog({
+        'codes': synthetic_codes(n, seed),
+        'label_blob': label_blob, 'label_offsets': label_offsets,
+        'url_blob': url_blob, 'url_offsets': url_offsets,
+    })
+
+
+def synthetic_score_map(categories: list, seed: int = 0) -> dict:
+    """Score map (attr -> value -> category -> score) shaped like parse_score_map's output."""
+    rnd = random.Random(seed)
+    mapping = defaultdict(lambda: defaultdict(dict))
+    for attr, values in ATTRIBUTE_CODE_MAPS.items():
+        for value in values.values():
+            for cat in categories:
+                mapping[attr][value][cat] = 0 if value == "NA" else rnd.choice((0, 0, 1, 2, 3, 4, 5))
+    return mapping
+
+
+def synthetic_score_maps(seed: int = 0) -> tuple:
+    """(style score map, body shape score map)."""
+    return synthetic_score_map(STYLE_NAMES, seed), synthetic_score_map(BODYSHAPE_NAMES, seed + 1)
+
+
+def write_sources(directory: str, n: int, seed: int = 0) -> dict:
+    """
+    Writes the three data sources as CSV files in the spreadsheets' formats and
+    returns their paths, keyed 'style', 'bodyshape' and 'outfits'.
+    """
+    style_map, bodyshape_map = synthetic_score_maps(seed)
+    paths = {
+        'style': os.path.join(directory, "style_scores.csv"),
+        'bodyshape': os.path.join(directory, "bodyshape_scores.csv"),
+        'outfits': os.path.join(directory, "outfits.csv"),
+    }
+    _write_score_map(paths['style'], style_map, STYLE_NAMES)
+    _write_score_map(paths['bodyshape'], bodyshape_map, BODYSHAPE_NAMES)
+    catalog = synthetic_catalog(n, seed)
+    with open(paths['outfits'], "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(ATTRIBUTE_NAMES + ['image_label', 'image_url'])
+        for row, codes in enumerate(catalog.codes.tolist()):
+            writer.writerow(codes + [catalog.label(row), catalog.url(row)])
+    return paths
+
+
+def _write_score_map(path, mapping, categories):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(['Classification', 'Attribute Name'] + categories)
+        for attr, by_value in mapping.items():
+            for value, scores in by_value.items():
+                writer.writerow([attr, value] + [scores[cat] for cat in categories])
+
+
+def request_mix(count: int, seed: int = 0) -> list:
+    """`count` /recommend request dicts replaying PROMPT_MIX over random profiles."""
+    rnd = random.Random(seed)
+    prompts = [prompt for prompt, _ in PROMPT_MIX]
+    weights = [weight for _, weight in PROMPT_MIX]
+    return [
+        {
+            'gender': rnd.choices(("male", "female"), (0.45, 0.55))[0],
+            'body_shape': rnd.choice(BODYSHAPE_NAMES),
+            'prompt': rnd.choices(prompts, weights)[0],
+            'topk': rnd.choices((3, 5, 10), (0.8, 0.15, 0.05))[0],
+            'feature_mode': rnd.choices(("boost", "filter"), (0.9, 0.1))[0],
+        }
+        for _ in range(count)
+    ]
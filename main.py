@@ -1,20 +1,50 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, HTTPException, Header, Path
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
-from outfit_recommender.data_loader import load_score_map, load_outfit_dataset
+from typing import Optional, List, Dict, Any, Literal
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+from outfit_recommender.data_loader import load_sources_async, refresh_snapshots, SnapshotRefresher
 from outfit_recommender.attribute_mapping import STYLE_NAMES, BODYSHAPE_NAMES
-from outfit_recommender.nlp_prompt_parser import parse_prompt
-
-# Import your new recommender function here (adjust path if needed)
-from outfit_recommender.new_recommender import recommend_best_combined
+from outfit_recommender.nlp_prompt_parser import parse_prompt_cached, PROMPT_CACHE
+from outfit_recommender.index import FEATURE_MODES
+from outfit_recommender.serving import ServingState
+from outfit_recommender.profiles import DEFAULT_PROFILE, validate_weights
+from outfit_recommender.delta import CatalogDelta
+from outfit_recommender.workers import ScoringPool, ShardedScoringPool
+from outfit_recommender.cache import LRUCache
+from outfit_recommender.rendering import outfit_json, recommendations_json, batch_json, page_json
+from outfit_recommender import metrics
 
 from collections import defaultdict
 from fastapi.middleware.cors import CORSMiddleware
 
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Data loads in the background: the server accepts connections right away and
+    # /ready reports when recommendations can be served
+    loader = asyncio.create_task(load_data())
+    try:
+        yield
+    finally:
+        loader.cancel()
+        if snapshot_refresher is not None:
+            snapshot_refresher.stop()
+        if serving is not None:
+            serving.close()
+
 app = FastAPI(
     title="AI-Driven Outfit Recommender API",
     description="Recommend outfits based on user profile and natural language prompt.",
-    version="1.0.1"
+    version="1.0.1",
+    lifespan=lifespan,
 )
 
 # Allowed origins for CORS
@@ -31,25 +61,213 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-STYLE_SCORE_CSV_URL = "https://docs.google.com/spreadsheets/d/1Zx66-QAVjLJjUdP3rVfE2nbCWVQwkVv0IKaLRO7EH9M/export?format=csv&gid=0"
-BODYSHAPE_SCORE_CSV_URL = "https://docs.google.com/spreadsheets/d/1Zx66-QAVjLJjUdP3rVfE2nbCWVQwkVv0IKaLRO7EH9M/export?format=csv&gid=28283272"
-OUTFIT_DATASET_CSV_URL = "https://docs.google.com/spreadsheets/d/1Uj88haHGZCsSQW5c27SDcJyvcBPlLJGP8WKZvw2dWqg/export?format=csv&gid=1320449891"
+# Each source may be overridden with a local CSV path or another URL (e.g. for offline runs)
+STYLE_SCORE_CSV_URL = os.environ.get("STYLE_SCORE_CSV_URL", "https://docs.google.com/spreadsheets/d/1Zx66-QAVjLJjUdP3rVfE2nbCWVQwkVv0IKaLRO7EH9M/export?format=csv&gid=0")
+BODYSHAPE_SCORE_CSV_URL = os.environ.get("BODYSHAPE_SCORE_CSV_URL", "https://docs.google.com/spreadsheets/d/1Zx66-QAVjLJjUdP3rVfE2nbCWVQwkVv0IKaLRO7EH9M/export?format=csv&gid=28283272")
+OUTFIT_DATASET_CSV_URL = os.environ.get("OUTFIT_DATASET_CSV_URL", "https://docs.google.com/spreadsheets/d/1Uj88haHGZCsSQW5c27SDcJyvcBPlLJGP8WKZvw2dWqg/export?format=csv&gid=1320449891")
+
+# Local snapshot cache shared by all workers (the catalog is memory-mapped from it);
+# unset to always fetch from the sources and keep a private copy per process
+CACHE_DIR = os.environ.get("OUTFIT_CACHE_DIR")
+SNAPSHOT_REFRESH_SECONDS = float(os.environ.get("OUTFIT_SNAPSHOT_REFRESH_SECONDS", "300"))
+
+# Scoring runs in this many worker processes; 0 scores in a thread of this process
+SCORING_WORKERS = int(os.environ.get("OUTFIT_SCORING_WORKERS", str(min(4, os.cpu_count() or 1))))
+# For very large catalogs: split the catalog across this many worker processes and
+# score every request on all of them at once (replaces OUTFIT_SCORING_WORKERS)
+SCORING_SHARDS = int(os.environ.get("OUTFIT_SCORING_SHARDS", "0"))
 
 DEFAULT_ATTR_WEIGHTS = defaultdict(lambda: 1.0)
+DEFAULT_STYLE = "Casual"
+
+# Recommendation responses per (catalog version, profile, parsed intent, topk, feature mode).
+# Loading new data bumps the version, so stale entries can never be hit again.
+RESULT_CACHE_SIZE = int(os.environ.get("OUTFIT_RESULT_CACHE_SIZE", "4096"))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get("OUTFIT_RESULT_CACHE_TTL_SECONDS", "300"))
+result_cache = LRUCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL_SECONDS)
+_catalog_versions = itertools.count(1)
+
+# Ranked result sets behind paginated and streamed recommendations: up to
+# RANKING_DEPTH outfits per (catalog version, profile, parsed intent, feature mode,
+# diversity), ranked once and kept for a short TTL so later pages are only serialized
+RANKING_DEPTH = int(os.environ.get("OUTFIT_RANKING_DEPTH", "500"))
+RANKING_CACHE_SIZE = int(os.environ.get("OUTFIT_RANKING_CACHE_SIZE", "64"))
+RANKING_CACHE_TTL_SECONDS = float(os.environ.get("OUTFIT_RANKING_CACHE_TTL_SECONDS", "120"))
+ranking_cache = LRUCache(maxsize=RANKING_CACHE_SIZE, ttl=RANKING_CACHE_TTL_SECONDS)
+MAX_PAGE_SIZE = 100
+
+# Reloads touching at most this share of the catalog update the previous state
+# incrementally; larger ones rebuild it
+MAX_DELTA_FRACTION = float(os.environ.get("OUTFIT_MAX_DELTA_FRACTION", "0.25"))
+
+# Required in the X-Admin-Token header of admin endpoints when set
+ADMIN_TOKEN = os.environ.get("OUTFIT_ADMIN_TOKEN")
 
-@app.on_event("startup")
-def load_data():
-    global style_score_map, bodyshape_score_map, outfits
-    style_score_map = load_score_map(STYLE_SCORE_CSV_URL, STYLE_NAMES)
-    bodyshape_score_map = load_score_map(BODYSHAPE_SCORE_CSV_URL, BODYSHAPE_NAMES)
-    outfits = load_outfit_dataset(OUTFIT_DATASET_CSV_URL)
+# Optional JSON file of weight profiles ({"name": {"attribute": weight, ...}, ...})
+# registered at startup; more can be registered through /admin/weight-profiles
+WEIGHT_PROFILES_FILE = os.environ.get("OUTFIT_WEIGHT_PROFILES_FILE")
 
-class RecommendationRequest(BaseModel):
+SOURCES = {
+    STYLE_SCORE_CSV_URL: STYLE_NAMES,
+    BODYSHAPE_SCORE_CSV_URL: BODYSHAPE_NAMES,
+    OUTFIT_DATASET_CSV_URL: None,
+}
+
+# The data requests are served from; replaced as a whole by reload_data()
+serving: Optional[ServingState] = None
+# Reported by /ready: "loading", "ready" or "failed" (with the error)
+load_status = {"status": "loading", "error": None}
+snapshot_refresher = None
+# Metadata of the snapshots `serving` was loaded from (source -> header meta); with
+# CACHE_DIR, any snapshot differing from it on disk triggers a reload
+served_snapshots: Dict[str, dict] = {}
+_reload_lock = asyncio.Lock()
+# Registered weight profiles (name -> weights) beyond the default; every new
+# ServingState compiles all of them. Changed under _reload_lock only
+weight_profiles: Dict[str, Dict[str, float]] = {}
+
+async def load_data():
+    try:
+        if WEIGHT_PROFILES_FILE:
+            weight_profiles.update(await asyncio.to_thread(_read_weight_profiles, WEIGHT_PROFILES_FILE))
+        await reload_data()
+        start_snapshot_refresh(asyncio.get_running_loop())
+        load_status.update(status="ready", error=None)
+    except Exception as e:
+        logger.exception("Loading outfit data failed")
+        load_status.update(status="failed", error=str(e))
+
+def _read_weight_profiles(path) -> dict:
+    with open(path, encoding="utf-8") as f:
+        profiles = json.load(f)
+    if DEFAULT_PROFILE in profiles:
+        raise ValueError(f"{path}: the {DEFAULT_PROFILE!r} weight profile cannot be redefined")
+    return {name: validate_weights(weights) for name, weights in profiles.items()}
+
+async def reload_data(refresh: bool = False) -> ServingState:
+    """
+    Builds a complete new ServingState from the sources and swaps it in. The previous
+    state keeps serving until the swap; its pool is shut down once the last request
+    holding that state is done (see ServingState.retire).
+    With `refresh`, changed sources are re-fetched into the snapshot cache first.
+    """
+    global serving, served_snapshots
+    async with _reload_lock:
+        if refresh and CACHE_DIR:
+            await asyncio.to_thread(refresh_snapshots, SOURCES, CACHE_DIR)
+        snapshots = {}
+        state = await _build_state(next(_catalog_versions), serving, snapshots)
+        previous, serving = serving, state
+        served_snapshots = snapshots
+    if previous is not None:
+        previous.retire()
+    return state
+
+async def _build_state(version: int, previous: Optional[ServingState] = None, snapshots=None) -> ServingState:
+    # The three sources are fetched concurrently; an outfit catalog that is already
+    # loaded is updated with the rows that changed instead of being decoded again.
+    # `snapshots` receives the metadata of the snapshots the state is loaded from
+    loaded = await load_sources_async(
+        SOURCES, cache_dir=CACHE_DIR,
+        previous={OUTFIT_DATASET_CSV_URL: previous.outfits} if previous is not None else None,
+        snapshots=snapshots,
+    )
+    style_score_map = loaded[STYLE_SCORE_CSV_URL]
+    bodyshape_score_map = loaded[BODYSHAPE_SCORE_CSV_URL]
+    # Columnar catalog; with CACHE_DIR every worker maps the same snapshot file
+    outfits = loaded[OUTFIT_DATASET_CSV_URL]
+    pool = None
+    if SCORING_SHARDS > 0:
+        pool = ShardedScoringPool(
+            outfits, style_score_map, bodyshape_score_map, DEFAULT_ATTR_WEIGHTS, shards=SCORING_SHARDS,
+            profiles=weight_profiles,
+        )
+    elif SCORING_WORKERS > 0:
+        pool = ScoringPool(
+            outfits, style_score_map, bodyshape_score_map, DEFAULT_ATTR_WEIGHTS, max_workers=SCORING_WORKERS,
+            profiles=weight_profiles,
+        )
+    delta = None
+    if (
+        previous is not None
+        and previous.style_score_map == style_score_map
+        and previous.bodyshape_score_map == bodyshape_score_map
+    ):
+        delta = CatalogDelta.between(previous.outfits, outfits)
+    try:
+        if delta is not None and len(delta) <= len(outfits) * MAX_DELTA_FRACTION:
+            state = await asyncio.to_thread(previous.updated, version, outfits, delta, pool)
+        else:
+            state = await asyncio.to_thread(
+                ServingState, version, style_score_map, bodyshape_score_map, outfits, DEFAULT_ATTR_WEIGHTS, pool,
+                dict(weight_profiles),
+            )
+        # Warm the workers before the state is published, so the swap costs requests nothing
+        if pool is not None:
+            await pool.start()
+    except BaseException:
+        if pool is not None:
+            pool.shutdown()
+        raise
+    return state
+
+def start_snapshot_refresh(loop):
+    # Keep the on-disk snapshots current and reload whenever one of them differs from
+    # what is served, also when another worker (or its /admin/reload) rewrote it
+    global snapshot_refresher
+    if not CACHE_DIR:
+        return
+    def on_change(sources):
+        logger.info("Sources changed, reloading: %s", ", ".join(sources))
+        asyncio.run_coroutine_threadsafe(_background_reload(), loop)
+    snapshot_refresher = SnapshotRefresher(
+        SOURCES, CACHE_DIR, interval=SNAPSHOT_REFRESH_SECONDS, on_change=on_change, served=lambda: served_snapshots,
+    )
+    snapshot_refresher.start()
+
+async def _background_reload():
+    try:
+        await reload_data()
+    except Exception:
+        logger.exception("Reloading outfit data failed; still serving the previous version")
+
+@contextmanager
+def _serving_state():
+    # The state a request is served from, held until the request is done: a reload
+    # retires the state it replaces, and its scoring pool stays up until then
+    state = serving
+    if state is None:
+        raise HTTPException(status_code=503, detail=f"Outfit data is {load_status['status']}")
+    state.acquire()
+    try:
+        yield state
+    finally:
+        state.release()
+
+class QueryRequest(BaseModel):
     gender: str = Field(..., example="male")
     body_shape: str = Field(..., example="Hourglass")
     prompt: str = Field(..., example="I want a formal outfit for a summer wedding, prefer short sleeves and cotton")
+    feature_mode: Literal[FEATURE_MODES] = Field(
+        "boost", description="'boost' rewards outfits matching prompt features; 'filter' only returns outfits matching all of them"
+    )
+    diversity: float = Field(
+        0.0, ge=0.0, le=1.0,
+        description="0 ranks by score alone; higher values trade score for variety among the results (MMR re-ranking)",
+    )
+    weight_profile: str = Field(
+        DEFAULT_PROFILE, description="Named attribute weight profile to score with (see /admin/weight-profiles)"
+    )
+
+class RecommendationRequest(QueryRequest):
     topk: int = Field(3, ge=1, le=10, description="Number of recommendations to return")
 
+class PagedRecommendationRequest(QueryRequest):
+    page_size: int = Field(10, ge=1, le=MAX_PAGE_SIZE, description="Recommendations per page")
+
+class StreamRecommendationRequest(QueryRequest):
+    limit: int = Field(RANKING_DEPTH, ge=1, le=RANKING_DEPTH, description="Recommendations to stream at most")
+
 class OutfitResponse(BaseModel):
     gender: str
     image_label: str
@@ -62,33 +280,280 @@ class OutfitResponse(BaseModel):
 class RecommendationResponse(BaseModel):
     recommendations: List[OutfitResponse]
 
+class RecommendationPage(BaseModel):
+    recommendations: List[OutfitResponse]
+    total: int = Field(..., description="Recommendations in the whole ranked result set")
+    next_cursor: Optional[str] = Field(None, description="Pass to GET /recommend/pages/{cursor} for the next page; null on the last page")
+
+class BatchRecommendationRequest(BaseModel):
+    requests: List[RecommendationRequest]
+
+class BatchRecommendationResponse(BaseModel):
+    results: List[RecommendationResponse]
+
+class SimilarOutfitResponse(BaseModel):
+    gender: str
+    image_label: str
+    image_url: str
+    attributes: Dict[str, Any]
+    matching_attributes: int
+
+class SimilarOutfitsResponse(BaseModel):
+    image_label: str
+    similar: List[SimilarOutfitResponse]
+
+class WeightProfileRequest(BaseModel):
+    weights: Dict[str, float] = Field(
+        ..., example={"fabric_upper": 2.0, "pattern_upper": 0.5}, description="Attribute -> weight (>= 0); attributes left out weigh 1.0"
+    )
+
+@app.get("/ready")
+def ready():
+    state = serving
+    body = dict(
+        load_status,
+        catalog_version=state.version if state else 0,
+        outfits=len(state.outfits) if state else None,
+    )
+    return JSONResponse(body, status_code=200 if state else 503)
+
+@app.post("/admin/reload")
+async def reload(x_admin_token: Optional[str] = Header(None)):
+    # Re-fetches changed sources and swaps in the new data without a restart
+    _check_admin_token(x_admin_token)
+    try:
+        state = await reload_data(refresh=True)
+    except Exception as e:
+        logger.exception("Reloading outfit data failed")
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving the previous version: {e}")
+    return {"catalog_version": state.version, "outfits": len(state.outfits)}
+
+def _check_admin_token(x_admin_token):
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+PROFILE_NAME = Path(..., pattern=r"^[A-Za-z0-9_.-]{1,64}$", description="Weight profile name")
+
+@app.get("/admin/weight-profiles")
+def list_weight_profiles(x_admin_token: Optional[str] = Header(None)):
+    _check_admin_token(x_admin_token)
+    return {"profiles": {DEFAULT_PROFILE: {}, **weight_profiles}}
+
+@app.put("/admin/weight-profiles/{name}")
+async def put_weight_profile(request: WeightProfileRequest, name: str = PROFILE_NAME, x_admin_token: Optional[str] = Header(None)):
+    # Compiles the profile into new score tables next to the live ones, then swaps the
+    # serving state; requests already running finish with the weights they started with
+    global serving
+    _check_admin_token(x_admin_token)
+    if name == DEFAULT_PROFILE:
+        raise HTTPException(status_code=400, detail=f"The {DEFAULT_PROFILE!r} weight profile cannot be changed")
+    try:
+        weights = validate_weights(request.weights)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    async with _reload_lock:
+        # Before the first load completes the profile is only recorded; the load compiles it
+        state = serving
+        if state is not None:
+            state = await asyncio.to_thread(state.with_profile, name, weights)
+            if state.pool is not None:
+                await state.pool.register_profile(name, weights)
+        weight_profiles[name] = weights
+        serving = state
+    logger.info("Weight profile %s registered", name)
+    return {"name": name, "weights": weights}
+
+@app.delete("/admin/weight-profiles/{name}")
+async def delete_weight_profile(name: str = PROFILE_NAME, x_admin_token: Optional[str] = Header(None)):
+    global serving
+    _check_admin_token(x_admin_token)
+    if name == DEFAULT_PROFILE:
+        raise HTTPException(status_code=400, detail=f"The {DEFAULT_PROFILE!r} weight profile cannot be deleted")
+    async with _reload_lock:
+        if name not in weight_profiles:
+            raise HTTPException(status_code=404, detail=f"Unknown weight profile: {name}")
+        del weight_profiles[name]
+        state = serving
+        if state is not None:
+            serving = state.without_profile(name)
+            if state.pool is not None:
+                await state.pool.drop_profile(name)
+    logger.info("Weight profile %s deleted", name)
+    return {"name": name}
+
 @app.post("/recommend", response_model=RecommendationResponse)
-def recommend_outfits(request: RecommendationRequest):
-    filtered = [o for o in outfits if o['gender'] == request.gender or o['gender'] == "unisex"]
-    parsed = parse_prompt(request.prompt)
-    style = parsed['style'] or "Casual"
-    features = parsed['features']
-    results = recommend_best_combined(
-        filtered,
-        request.prompt,
-        style_score_map,
-        bodyshape_score_map,
-        DEFAULT_ATTR_WEIGHTS,
-        topk=request.topk,
-        style=style,
-        body_shape=request.body_shape,
-        features=features
+async def recommend_outfits(request: RecommendationRequest):
+    # Read once: the whole request is served from one version of the data
+    with _serving_state() as state:
+        received = start = metrics.clock()
+        # An uncached prompt may need the spaCy fallback, so parse off the event loop
+        parsed = await asyncio.to_thread(parse_prompt_cached, request.prompt)
+        start = metrics.observe("request_parse", start)
+        key = _query_key(state, request, parsed) + (request.topk,)
+        response = result_cache.get(key)
+        start = metrics.observe("result_cache", start)
+        if response is None:
+            results = await state.recommend(request.model_dump(), DEFAULT_STYLE, parsed)
+            start = metrics.observe("recommend", start)
+            response = recommendations_json(results).encode()
+            metrics.observe("response", start)
+            result_cache.set(key, response)
+        metrics.observe("request", received)
+        return _json(response)
+
+def _query_key(state, request: QueryRequest, parsed) -> tuple:
+    # The profile's weights are part of the key: a re-registered profile never hits old entries
+    return (
+        state.version, request.gender, request.body_shape, parsed['style'] or DEFAULT_STYLE, parsed['season'],
+        parsed['occasion'], tuple(sorted(parsed['features'].items())), request.feature_mode, request.diversity,
+        request.weight_profile, _weight_profile(state, request.weight_profile).key,
     )
-    resp = [
-        OutfitResponse(
-            gender=res['outfit']['gender'],
-            image_label=res['outfit']['image_label'],
-            image_url=res['outfit']['image_url'],
-            attributes={k: v for k, v in res['outfit'].items() if k not in ['image_label', 'image_url', 'gender']},
-            total_score=res['score'],
-            style_score=res['style_score'],
-            bodyshape_score=res['bodyshape_score']
-        )
-        for res in results
-    ]
-    return RecommendationResponse(recommendations=resp)
+
+def _weight_profile(state, name):
+    try:
+        return state.profile(name)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown weight profile: {name}")
+
+def _json(body) -> Response:
+    # Recommendation bodies are rendered straight to JSON (see rendering.py) in the
+    # shape of the declared response_model, which then only documents the endpoint
+    return Response(content=body, media_type="application/json")
+
+@app.post("/recommend/batch", response_model=BatchRecommendationResponse)
+async def recommend_outfits_batch(request: BatchRecommendationRequest):
+    with _serving_state() as state:
+        for r in request.requests:
+            _weight_profile(state, r.weight_profile)
+        received = start = metrics.clock()
+        # Parses each distinct prompt once, here where the prompt cache is shared by all
+        # requests, and ranks the catalog once per (weight profile, style, body shape)
+        prompts = {r.prompt for r in request.requests}
+        parsed = await asyncio.to_thread(lambda: {prompt: parse_prompt_cached(prompt) for prompt in prompts})
+        start = metrics.observe("request_parse", start)
+        results = await state.recommend_batch([r.model_dump() for r in request.requests], DEFAULT_STYLE, parsed)
+        start = metrics.observe("recommend_batch", start)
+        response = _json(batch_json(results))
+        metrics.observe("response", start)
+        metrics.observe("request_batch", received)
+        return response
+
+async def _ranking(request: QueryRequest) -> tuple:
+    # (token, ranked results) for a query; the token names the cached result set in cursors
+    with _serving_state() as state:
+        start = metrics.clock()
+        parsed = await asyncio.to_thread(parse_prompt_cached, request.prompt)
+        start = metrics.observe("request_parse", start)
+        token = hashlib.blake2b(repr(_query_key(state, request, parsed)).encode(), digest_size=8).hexdigest()
+        results = ranking_cache.get(token)
+        start = metrics.observe("ranking_cache", start)
+        if results is None:
+            ranked_request = dict(request.model_dump(include=set(QueryRequest.model_fields)), topk=RANKING_DEPTH)
+            results = await state.recommend(ranked_request, DEFAULT_STYLE, parsed)
+            metrics.observe("recommend", start)
+            ranking_cache.set(token, results)
+        return token, results
+
+def _page(token, results, offset, page_size) -> Response:
+    stop = offset + page_size
+    next_cursor = f"{token}.{stop}.{page_size}" if stop < len(results) else None
+    return _json(page_json(results[offset:stop], len(results), next_cursor))
+
+@app.post("/recommend/pages", response_model=RecommendationPage)
+async def recommend_first_page(request: PagedRecommendationRequest):
+    # Ranks once (or reuses the cached ranking) and returns the first page with a cursor
+    received = metrics.clock()
+    token, results = await _ranking(request)
+    start = metrics.clock()
+    page = _page(token, results, 0, request.page_size)
+    metrics.observe("response", start)
+    metrics.observe("request_page", received)
+    return page
+
+@app.get("/recommend/pages/{cursor}", response_model=RecommendationPage)
+def recommend_next_page(cursor: str):
+    # Later pages are slices of the cached ranking: no scoring, only serialization
+    received = metrics.clock()
+    try:
+        token, offset, page_size = cursor.split(".")
+        offset, page_size = int(offset), int(page_size)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+    if offset < 0 or not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+    results = ranking_cache.get(token)
+    if results is None:
+        raise HTTPException(status_code=410, detail="Cursor expired; request the first page again")
+    page = _page(token, results, offset, page_size)
+    metrics.observe("request_page", received)
+    return page
+
+@app.post("/recommend/stream")
+async def recommend_stream(request: StreamRecommendationRequest):
+    # Newline-delimited JSON, one OutfitResponse per line, best first; each line is
+    # serialized only when the client is ready for it
+    token, results = await _ranking(request)
+
+    def lines():
+        for res in results[:request.limit]:
+            yield outfit_json(res) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/outfits/{image_label}/similar", response_model=SimilarOutfitsResponse)
+def similar_outfits(image_label: str, topk: int = Query(10, ge=1, le=50, description="Number of similar outfits to return")):
+    # Outfits sharing the most attribute values with this one, from the prebuilt similarity index
+    with _serving_state() as state:
+        start = metrics.clock()
+        row = state.similar.find(image_label)
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"Unknown outfit: {image_label}")
+        neighbours = state.similar.similar(row, topk)
+        start = metrics.observe("similar", start)
+        similar = []
+        for neighbour, matching in neighbours:
+            outfit = state.outfits[neighbour]
+            similar.append(SimilarOutfitResponse(
+                gender=outfit.gender,
+                image_label=outfit.image_label,
+                image_url=outfit.image_url,
+                attributes=outfit.attributes(),
+                matching_attributes=matching,
+            ))
+        metrics.observe("response", start)
+        return SimilarOutfitsResponse(image_label=image_label, similar=similar)
+
+def _cache_stat(name):
+    caches = {"prompt": PROMPT_CACHE, "result": result_cache, "ranking": ranking_cache}
+    return lambda: {label: cache.stats()[name] for label, cache in caches.items()}
+
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "outfit_catalog_outfits", "Outfits in the catalog being served.",
+    lambda: len(serving.outfits) if serving is not None else None,
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "outfit_catalog_version", "Version of the catalog being served.",
+    lambda: serving.version if serving is not None else 0,
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "outfit_cache_hits_total", "Cache hits.", _cache_stat("hits"), kind="counter", label="cache",
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "outfit_cache_misses_total", "Cache misses.", _cache_stat("misses"), kind="counter", label="cache",
+))
+metrics.REGISTRY.register(metrics.CallbackMetric(
+    "outfit_cache_hit_ratio", "Cache hits over lookups since start.", _cache_stat("hit_rate"), label="cache",
+))
+
+@app.get("/metrics")
+def prometheus_metrics():
+    # Stage histograms are empty while OUTFIT_METRICS=0; catalog and cache figures are always reported
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "catalog_version": serving.version if serving else 0,
+        "prompt_cache": PROMPT_CACHE.stats(),
+        "result_cache": result_cache.stats(),
+        "ranking_cache": ranking_cache.stats(),
+    }
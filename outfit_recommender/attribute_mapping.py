@@ -61,8 +61,16 @@ ATTRIBUTE_CODE_MAPS = {
 
 STYLE_NAMES = ['Formal', 'Casual', 'Trendy', 'Bohemian', 'Minimalist', 'Streetwear', 'Elegant']
 BODYSHAPE_NAMES = ['Hourglass', 'Triangle', 'Inverted Triangle', 'Rectangle', 'Oval']
+GENDER_NAMES = ['male', 'female', 'unisex']
 SEASON_NAMES = ['summer', 'winter', 'spring', 'fall', 'autumn', 'rainy', 'dry', 'hot', 'cold']
 OCCASION_NAMES = [
     'wedding', 'party', 'interview', 'work', 'office', 'business', 'meeting',
     'holiday', 'vacation', 'date', 'sport', 'gym', 'ceremony', 'graduation', 'picnic'
-]
\ No newline at end of file
+]
+
+# Attributes each prompt feature (see nlp_prompt_parser.FEATURE_KEYWORDS) can match
+FEATURE_ATTRIBUTES = {
+    'sleeve': ['sleeve_length'],
+    'fabric': ['fabric_upper', 'fabric_lower', 'fabric_outer'],
+    'pattern': ['pattern_upper', 'pattern_lower', 'pattern_outer'],
+}
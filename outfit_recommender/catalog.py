@@ -0,0 +1,204 @@
+"""
+Read-only columnar outfit catalog.
+
+Attribute values are stored as small integer codes (interned through
+ATTRIBUTE_CODE_MAPS), labels and URLs as packed UTF-8 string tables. The arrays are
+written to a snapshot file by data_loader.py and can be attached by any number of
+worker processes as zero-copy memory maps.
+"""
+from collections.abc import Mapping
+
+import numpy as np
+
+from .attribute_mapping import ATTRIBUTE_CODE_MAPS, GENDER_NAMES
+from .snapshot import read_snapshot, pack_strings, unpack_strings
+
+# Fixed attribute order used for the columns of the code matrix
+ATTRIBUTE_NAMES = list(ATTRIBUTE_CODE_MAPS)
+
+# Decoded value -> integer code, per attribute
+VALUE_CODES = {
+    attr: {value: int(code) for code, value in codes.items()}
+    for attr, codes in ATTRIBUTE_CODE_MAPS.items()
+}
+NA_CODES = np.array([VALUE_CODES[attr]["NA"] for attr in ATTRIBUTE_NAMES], dtype=np.intp)
+
+# Flattened lookup-table layout: each attribute owns a contiguous slice of a table row
+ATTRIBUTE_SIZES = np.array([len(ATTRIBUTE_CODE_MAPS[attr]) for attr in ATTRIBUTE_NAMES], dtype=np.intp)
+ATTRIBUTE_OFFSETS = np.concatenate(([0], np.cumsum(ATTRIBUTE_SIZES)[:-1])).astype(np.intp)
+TABLE_WIDTH = int(ATTRIBUTE_SIZES.sum())
+
+# Integer code -> decoded value, per attribute column
+_VALUE_NAMES = [
+    [ATTRIBUTE_CODE_MAPS[attr][str(code)] for code in range(len(ATTRIBUTE_CODE_MAPS[attr]))]
+    for attr in ATTRIBUTE_NAMES
+]
+_COLUMNS = {attr: col for col, attr in enumerate(ATTRIBUTE_NAMES)}
+_GENDER_CODES = {gender: code for code, gender in enumerate(GENDER_NAMES)}
+_EXTRA_KEYS = ('image_label', 'image_url', 'gender')
+
+
+class Outfit(Mapping):
+    """
+    One outfit: attribute codes packed into a bytes object plus its label, URL and
+    gender. Behaves as a read-only mapping with the same keys and values as the
+    decoded outfit dicts; attribute strings are only looked up on access.
+    """
+    __slots__ = ('codes', 'image_label', 'image_url', 'gender')
+
+    def __init__(self, codes: bytes, image_label: str, image_url: str, gender: str):
+        self.codes = codes
+        self.image_label = image_label
+        self.image_url = image_url
+        self.gender = gender
+
+    def __getitem__(self, key):
+        col = _COLUMNS.get(key)
+        if col is not None:
+            return _VALUE_NAMES[col][self.codes[col]]
+        if key in _EXTRA_KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from ATTRIBUTE_NAMES
+        yield from _EXTRA_KEYS
+
+    def __len__(self):
+        return len(ATTRIBUTE_NAMES) + len(_EXTRA_KEYS)
+
+    def __repr__(self):
+        return f"Outfit({self.image_label!r})"
+
+    def attributes(self) -> dict:
+        """Decoded attribute values, without label, URL and gender."""
+        return {attr: names[code] for attr, names, code in zip(ATTRIBUTE_NAMES, _VALUE_NAMES, self.codes)}
+
+
+def encode_outfits(outfits: list) -> np.ndarray:
+    """Encodes outfits (Outfit objects or decoded dicts) into an (outfits x attributes) uint8 code matrix."""
+    if outfits and all(isinstance(o, Outfit) for o in outfits):
+        packed = b"".join(o.codes for o in outfits)
+        return np.frombuffer(packed, dtype=np.uint8).reshape(len(outfits), len(ATTRIBUTE_NAMES)).copy()
+    codes = np.empty((len(outfits), len(ATTRIBUTE_NAMES)), dtype=np.uint8)
+    for col, attr in enumerate(ATTRIBUTE_NAMES):
+        lookup = VALUE_CODES[attr]
+        na = int(NA_CODES[col])
+        codes[:, col] = [lookup.get(outfit.get(attr), na) for outfit in outfits]
+    return codes
+
+
+def infer_gender_from_label(image_label):
+    label = image_label.lower()
+    if label.startswith("men"):
+        return "male"
+    elif label.startswith("women"):
+        return "female"
+    return "unisex"
+
+
+class Catalog:
+    """
+    Columnar outfit catalog. Indexing or iterating yields Outfit views built on
+    access; scoring code works on `codes` and `gender_codes` directly.
+    """
+
+    def __init__(self, arrays: dict, path: str = None):
+        # Snapshot file backing the arrays, if any; other processes can attach() it
+        self.path = path
+        self.codes = arrays['codes']
+        self._label_blob = arrays['label_blob']
+        self._label_offsets = arrays['label_offsets']
+        self._url_blob = arrays['url_blob']
+        self._url_offsets = arrays['url_offsets']
+        # Digest of each row's source CSV line (see delta.py), if known
+        self.digests = arrays.get('row_digests')
+        if 'gender_codes' in arrays:
+            self.gender_codes = arrays['gender_codes']
+        else:
+            self.gender_codes = label_gender_codes(unpack_strings(self._label_blob, self._label_offsets))
+
+    @classmethod
+    def from_outfits(cls, outfits: list, digests: np.ndarray = None) -> "Catalog":
+        """Builds a catalog from Outfit objects or decoded outfit dicts (plus optional row digests)."""
+        labels = [o.get('image_label', '') for o in outfits]
+        label_blob, label_offsets = pack_strings(labels)
+        url_blob, url_offsets = pack_strings([o.get('image_url', '') for o in outfits])
+        arrays = {
+            'codes': encode_outfits(outfits),
+            'gender_codes': gender_codes(outfits),
+            'label_blob': label_blob, 'label_offsets': label_offsets,
+            'url_blob': url_blob, 'url_offsets': url_offsets,
+        }
+        if digests is not None:
+            arrays['row_digests'] = digests
+        return cls(arrays)
+
+    def arrays(self) -> dict:
+        arrays = {
+            'codes': self.codes,
+            'gender_codes': self.gender_codes,
+            'label_blob': self._label_blob, 'label_offsets': self._label_offsets,
+            'url_blob': self._url_blob, 'url_offsets': self._url_offsets,
+        }
+        if self.digests is not None:
+            arrays['row_digests'] = self.digests
+        return arrays
+
+    def slice(self, start: int, stop: int) -> "Catalog":
+        """Catalog of rows [start, stop); views of this one's arrays where possible."""
+        label_offsets = self._label_offsets[start:stop + 1]
+        url_offsets = self._url_offsets[start:stop + 1]
+        arrays = {
+            'codes': self.codes[start:stop],
+            'gender_codes': self.gender_codes[start:stop],
+            'label_blob': self._label_blob[label_offsets[0]:label_offsets[-1]],
+            'label_offsets': label_offsets - label_offsets[0],
+            'url_blob': self._url_blob[url_offsets[0]:url_offsets[-1]],
+            'url_offsets': url_offsets - url_offsets[0],
+        }
+        if self.digests is not None:
+            arrays['row_digests'] = self.digests[start:stop]
+        return Catalog(arrays)
+
+    @classmethod
+    def attach(cls, path: str) -> "Catalog":
+        """Memory-maps a catalog snapshot file; no data is copied into this process."""
+        arrays, _ = read_snapshot(path)
+        return cls(arrays, path=path)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self._decode(int(row))
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self._decode(row)
+
+    def label(self, row: int) -> str:
+        return _string_at(self._label_blob, self._label_offsets, row)
+
+    def url(self, row: int) -> str:
+        return _string_at(self._url_blob, self._url_offsets, row)
+
+    def gender(self, row: int) -> str:
+        return GENDER_NAMES[self.gender_codes[row]]
+
+    def _decode(self, row):
+        return Outfit(self.codes[row].tobytes(), self.label(row), self.url(row), self.gender(row))
+
+
+def gender_codes(outfits: list) -> np.ndarray:
+    """GENDER_NAMES codes of Outfit objects or decoded outfit dicts (unisex if unknown)."""
+    return np.array([_GENDER_CODES.get(o.get('gender'), _GENDER_CODES['unisex']) for o in outfits], dtype=np.uint8)
+
+
+def _string_at(blob, offsets, row):
+    return blob[offsets[row]:offsets[row + 1]].tobytes().decode('utf-8')
+
+
+def label_gender_codes(labels: list) -> np.ndarray:
+    """GENDER_NAMES codes inferred from image labels (see infer_gender_from_label)."""
+    return np.array([_GENDER_CODES[infer_gender_from_label(label)] for label in labels], dtype=np.uint8)
@@ -1,21 +1,114 @@
+import asyncio
 import csv
-import requests
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+import numpy as np
 from collections import defaultdict
+from contextlib import ExitStack, contextmanager
 from .attribute_mapping import ATTRIBUTE_CODE_MAPS
+from .catalog import Catalog, Outfit, ATTRIBUTE_NAMES, NA_CODES, infer_gender_from_label, label_gender_codes
+from .delta import CatalogDelta, apply_delta, row_digests, strip_newline, chunks, CHUNK_ROWS
+from .snapshot import write_snapshot, read_snapshot, pack_strings, unpack_strings, StringPacker
 
-def infer_gender_from_label(image_label):
-    label = image_label.lower()
-    if label.startswith("men"):
-        return "male"
-    elif label.startswith("women"):
-        return "female"
-    return "unisex"
-
-def load_score_map(csv_url: str, col_names: list) -> dict:
-    """Loads a scoring matrix from a Google Sheets CSV URL."""
-    response = requests.get(csv_url)
-    response.raise_for_status()
-    lines = response.content.decode('utf-8').splitlines()
+try:
+    import fcntl
+except ImportError:  # Windows: snapshot creation is not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 30
+# Downloads are read in chunks of CHUNK_BYTES into a spool that stays in memory up to
+# SPOOL_MAX_BYTES and moves to a temporary file beyond that
+CHUNK_BYTES = 1 << 20
+SPOOL_MAX_BYTES = 8 << 20
+
+# The HTTP clients (requests, httpx) are imported on first use: local sources and
+# snapshot loads never need them, and they add noticeably to start-up time
+
+def _local_path(source: str):
+    """Returns the filesystem path for a local source, or None for HTTP(S) URLs."""
+    if source.startswith("file://"):
+        return source[len("file://"):]
+    if source.startswith(("http://", "https://")):
+        return None
+    return source
+
+def _conditional_headers(etag, last_modified) -> dict:
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+def _text_stream(binary):
+    # Lines keep their endings (newline=''), as the csv module expects
+    return io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+@contextmanager
+def open_csv(source: str, etag: str = None, last_modified: str = None):
+    """
+    Opens CSV from an HTTP(S) URL or a local path as a seekable text stream, without
+    ever holding the whole text: local files are read in place and downloads are
+    spooled in chunks. Sends a conditional request when `etag`/`last_modified` are
+    given. Yields (stream, etag, last_modified), with stream None if the source has
+    not changed.
+    """
+    path = _local_path(source)
+    if path is not None:
+        stat = os.stat(path)
+        tag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        if etag == tag:
+            yield None, etag, last_modified
+            return
+        with open(path, encoding='utf-8', newline='') as f:
+            yield f, tag, None
+        return
+    import requests
+    headers = _conditional_headers(etag, last_modified)
+    with requests.get(source, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as response:
+        if response.status_code == 304:
+            yield None, etag, last_modified
+            return
+        response.raise_for_status()
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        for chunk in response.iter_content(CHUNK_BYTES):
+            spool.write(chunk)
+    spool.seek(0)
+    with _text_stream(spool) as stream:
+        yield stream, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+async def spool_csv_async(client: "httpx.AsyncClient", source: str, etag: str = None, last_modified: str = None) -> tuple:
+    """
+    Downloads a remote CSV source over a shared httpx client (so requests to one host
+    reuse a connection) into a spool, in chunks, like open_csv. Returns (binary spool
+    file, etag, last_modified), with the spool None if the source has not changed.
+    """
+    headers = _conditional_headers(etag, last_modified)
+    async with client.stream("GET", source, headers=headers) as response:
+        if response.status_code == 304:
+            return None, etag, last_modified
+        response.raise_for_status()
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        async for chunk in response.aiter_bytes(CHUNK_BYTES):
+            spool.write(chunk)
+    spool.seek(0)
+    return spool, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+@contextmanager
+def _spooled_csv(spooled):
+    spool, etag, last_modified = spooled
+    with _text_stream(spool) as stream:
+        yield stream, etag, last_modified
+
+def parse_score_map(lines, col_names: list) -> dict:
+    """Parses scoring matrix CSV lines into attr -> value -> category -> score."""
     reader = csv.DictReader(lines)
     mapping = defaultdict(lambda: defaultdict(dict))
     for row in reader:
@@ -30,20 +123,376 @@ def load_score_map(csv_url: str, col_names: list) -> dict:
             mapping[attr][value][col] = score
     return mapping
 
-def load_outfit_dataset(csv_url: str) -> list:
-    """Loads the outfit dataset and decodes coded attributes. Infers gender from file name."""
-    response = requests.get(csv_url)
-    response.raise_for_status()
-    lines = response.content.decode('utf-8').splitlines()
-    reader = csv.DictReader(lines, delimiter=',')
+class _OutfitFields:
+    """Decodes outfit dataset CSV records (lists of fields) laid out as `header`."""
+
+    def __init__(self, header: list):
+        # The last of duplicate columns wins, as with csv.DictReader
+        position = {name: i for i, name in enumerate(header)}
+        # Unknown or missing codes decode to "NA", as before
+        self.columns = [
+            (position.get(attr), ATTRIBUTE_CODE_MAPS[attr], int(na)) for attr, na in zip(ATTRIBUTE_NAMES, NA_CODES)
+        ]
+        self.label = position.get('image_label')
+        self.url = position.get('image_url')
+
+    def decode(self, record: list) -> tuple:
+        """(attribute codes, image_label, image_url) of one record."""
+        size = len(record)
+        codes = bytes(
+            int(record[i]) if i is not None and i < size and record[i] in names else na
+            for i, names, na in self.columns
+        )
+        label = record[self.label] if self.label is not None and self.label < size else ''
+        url = record[self.url] if self.url is not None and self.url < size else ''
+        return codes, label, url
+
+def parse_outfit_dataset(lines) -> list:
+    """Parses outfit dataset CSV lines into Outfit objects. Infers gender from file name."""
+    reader = csv.reader(lines, delimiter=',')
+    header = next(reader, None)
+    if header is None:
+        return []
+    fields = _OutfitFields(header)
     dataset = []
-    for row in reader:
-        mapped = {}
-        for attr in ATTRIBUTE_CODE_MAPS:
-            code = row.get(attr, None)
-            mapped[attr] = ATTRIBUTE_CODE_MAPS[attr].get(code, "NA") if code is not None else "NA"
-        mapped['image_label'] = row.get('image_label', '')
-        mapped['image_url'] = row.get('image_url', '')
-        mapped['gender'] = infer_gender_from_label(mapped['image_label'])
-        dataset.append(mapped)
-    return dataset
\ No newline at end of file
+    for record in reader:
+        if not record:
+            continue  # blank line
+        codes, label, url = fields.decode(record)
+        dataset.append(Outfit(codes, label, url, infer_gender_from_label(label)))
+    return dataset
+
+def read_outfit_catalog(stream, chunk_rows: int = CHUNK_ROWS) -> Catalog:
+    """
+    Decodes outfit dataset CSV (a text stream opened with newline='', or text) into
+    a Catalog with row digests, `chunk_rows` records at a time. Codes, labels and URLs
+    go straight into packed buffers, so loading holds one chunk of records on top of
+    the compact catalog, never the whole text, its lines or a list of outfits.
+    """
+    if isinstance(stream, str):
+        stream = io.StringIO(stream, newline='')
+    # Source lines of the record being read, for its digest
+    consumed = []
+
+    def lines():
+        for line in stream:
+            consumed.append(line)
+            yield line
+
+    reader = csv.reader(lines(), delimiter=',')
+    header = next(reader, None)
+    if header is None:
+        return Catalog.from_outfits([], np.empty(0, dtype=np.uint64))
+    header_line = strip_newline(consumed[0])
+    # Digests only line up with rows when every record is a single line
+    single_line = len(consumed) == 1
+    consumed.clear()
+
+    def records():
+        nonlocal single_line
+        for record in reader:
+            single_line = single_line and len(consumed) == 1
+            line = consumed[0]
+            consumed.clear()
+            if record:
+                yield record, line
+
+    fields = _OutfitFields(header)
+    codes, genders, digests = bytearray(), bytearray(), []
+    labels, urls = StringPacker(), StringPacker()
+    for chunk in chunks(records(), chunk_rows):
+        decoded = [fields.decode(record) for record, _ in chunk]
+        codes += b"".join(row_codes for row_codes, _, _ in decoded)
+        chunk_labels = [label for _, label, _ in decoded]
+        labels.extend(chunk_labels)
+        urls.extend(url for _, _, url in decoded)
+        genders += label_gender_codes(chunk_labels).tobytes()
+        if single_line:
+            digests.append(row_digests(header_line, [strip_newline(line) for _, line in chunk]))
+    label_blob, label_offsets = labels.packed()
+    url_blob, url_offsets = urls.packed()
+    arrays = {
+        'codes': np.frombuffer(codes, dtype=np.uint8).reshape(len(labels), len(ATTRIBUTE_NAMES)),
+        'gender_codes': np.frombuffer(genders, dtype=np.uint8),
+        'label_blob': label_blob, 'label_offsets': label_offsets,
+        'url_blob': url_blob, 'url_offsets': url_offsets,
+    }
+    if single_line:
+        arrays['row_digests'] = np.concatenate(digests) if digests else np.empty(0, dtype=np.uint64)
+    return Catalog(arrays)
+
+def decode_outfit_catalog(stream, previous: Catalog = None) -> Catalog:
+    """
+    Decodes outfit dataset CSV (a seekable text stream, or text) into a Catalog with
+    row digests, streaming (see read_outfit_catalog). Given the `previous` catalog of
+    the same source, only added or edited lines are decoded and applied to it (see
+    delta.py); previous row order is kept, new rows go last.
+    """
+    if isinstance(stream, str):
+        stream = io.StringIO(stream, newline='')
+    if previous is not None:
+        delta = CatalogDelta.from_lines(previous, stream, parse_outfit_dataset)
+        if delta is not None:
+            return apply_delta(previous, delta)
+        stream.seek(0)
+    return read_outfit_catalog(stream)
+
+# --- Snapshot cache ---
+#
+# With a `cache_dir`, each source is decoded once and persisted as a memory-mapped
+# snapshot (see snapshot.py). Later loads, including other worker processes, read the
+# snapshot instead of the network. SnapshotRefresher keeps snapshots current with
+# conditional requests.
+
+def snapshot_path(cache_dir: str, source: str) -> str:
+    key = hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{key}.snap")
+
+def _score_map_arrays(mapping: dict, col_names: list) -> dict:
+    attrs, values, scores = [], [], []
+    for attr, by_value in mapping.items():
+        for value, by_col in by_value.items():
+            attrs.append(attr)
+            values.append(value)
+            scores.append([by_col.get(col, 0) for col in col_names])
+    attr_blob, attr_offsets = pack_strings(attrs)
+    value_blob, value_offsets = pack_strings(values)
+    return {
+        'attr_blob': attr_blob, 'attr_offsets': attr_offsets,
+        'value_blob': value_blob, 'value_offsets': value_offsets,
+        'scores': np.array(scores, dtype=np.int32).reshape(len(scores), len(col_names)),
+    }
+
+def _score_map_from_arrays(arrays: dict, col_names: list) -> dict:
+    attrs = unpack_strings(arrays['attr_blob'], arrays['attr_offsets'])
+    values = unpack_strings(arrays['value_blob'], arrays['value_offsets'])
+    mapping = defaultdict(lambda: defaultdict(dict))
+    for attr, value, scores in zip(attrs, values, arrays['scores'].tolist()):
+        mapping[attr][value] = dict(zip(col_names, scores))
+    return mapping
+
+def _read_cached(cache_dir, source):
+    path = snapshot_path(cache_dir, source)
+    if not os.path.exists(path):
+        return None
+    try:
+        return read_snapshot(path)
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+        return None
+
+def snapshot_meta(cache_dir: str, source: str):
+    """Metadata header of `source`'s snapshot, or None if there is no readable one."""
+    cached = _read_cached(cache_dir, source)
+    return cached[1] if cached else None
+
+def refresh_snapshot(source: str, cache_dir: str, col_names: list = None, force: bool = False) -> bool:
+    """
+    Re-fetches `source` into its snapshot if it changed upstream, using the stored
+    ETag/Last-Modified. `col_names` marks a scoring matrix; without it the source is
+    the outfit dataset. Returns True if a new snapshot was written.
+    Runs under the source's snapshot lock and reads the stored validators only once
+    it holds it, so of several workers refreshing at once only the first downloads
+    and rewrites; the others then find the snapshot current.
+    """
+    with _snapshot_lock(cache_dir, source):
+        return _refresh_snapshot(source, cache_dir, col_names, force)
+
+def _refresh_snapshot(source, cache_dir, col_names, force):
+    # refresh_snapshot, for callers already holding the source's snapshot lock
+    cached = None if force else _read_cached(cache_dir, source)
+    meta = cached[1] if cached else {}
+    with open_csv(source, meta.get('etag'), meta.get('last_modified')) as (stream, etag, last_modified):
+        if stream is None:
+            return False
+        # The outfit dataset is updated incrementally from its current snapshot
+        previous = Catalog(cached[0]) if cached and col_names is None and meta.get('col_names') is None else None
+        _store_snapshot(source, cache_dir, col_names, stream, etag, last_modified, previous)
+    return True
+
+def refresh_snapshots(sources: dict, cache_dir: str) -> list:
+    """
+    refresh_snapshot for every source (source -> score columns, None for the outfit
+    dataset). Failures are logged and skipped. Returns the sources that changed.
+    """
+    changed = []
+    for source, col_names in sources.items():
+        try:
+            if refresh_snapshot(source, cache_dir, list(col_names) if col_names is not None else None):
+                changed.append(source)
+        except Exception:
+            logger.exception("Snapshot refresh failed for %s", source)
+    return changed
+
+def _store_snapshot(source, cache_dir, col_names, stream, etag, last_modified, previous=None) -> dict:
+    if col_names is not None:
+        arrays = _score_map_arrays(parse_score_map(stream, col_names), col_names)
+    else:
+        arrays = decode_outfit_catalog(stream, previous).arrays()
+    write_snapshot(snapshot_path(cache_dir, source), arrays, {
+        'source': source,
+        'etag': etag,
+        'last_modified': last_modified,
+        'col_names': col_names,
+        # Tells every rewrite apart, also of sources served without ETag/Last-Modified
+        'written_ns': time.time_ns(),
+    })
+    return arrays
+
+def _usable(cached, col_names) -> bool:
+    return cached is not None and cached[1].get('col_names') == col_names
+
+@contextmanager
+def _snapshot_lock(cache_dir, source):
+    # Held while a snapshot is fetched and written: only the first of several workers
+    # creating or refreshing it does that, the rest wait here and then use its file
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(snapshot_path(cache_dir, source) + ".lock", "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+def _load_cached(source, cache_dir, col_names):
+    cached = _read_cached(cache_dir, source)
+    if not _usable(cached, col_names):
+        with _snapshot_lock(cache_dir, source):
+            cached = _read_cached(cache_dir, source)
+            if not _usable(cached, col_names):
+                _refresh_snapshot(source, cache_dir, col_names, force=True)
+                cached = read_snapshot(snapshot_path(cache_dir, source))
+    return cached[0]
+
+def load_score_map(csv_url: str, col_names: list, cache_dir: str = None) -> dict:
+    """Loads a scoring matrix from a Google Sheets CSV URL (or local path), via the snapshot cache if given."""
+    if cache_dir:
+        return _score_map_from_arrays(_load_cached(csv_url, cache_dir, list(col_names)), col_names)
+    with open_csv(csv_url) as (stream, _, _):
+        return parse_score_map(stream, col_names)
+
+def load_outfit_dataset(csv_url: str, cache_dir: str = None) -> list:
+    """Loads the outfit dataset and decodes coded attributes, via the snapshot cache if given."""
+    if cache_dir:
+        return list(load_outfit_catalog(csv_url, cache_dir))
+    with open_csv(csv_url) as (stream, _, _):
+        return parse_outfit_dataset(stream)
+
+def load_outfit_catalog(csv_url: str, cache_dir: str = None, previous: Catalog = None) -> Catalog:
+    """
+    Loads the outfit dataset as a columnar Catalog. With a `cache_dir` the catalog is
+    attached to the shared snapshot file, so all worker processes map the same pages.
+    Without one, a `previous` catalog of the same source is updated incrementally.
+    """
+    if cache_dir:
+        return Catalog(_load_cached(csv_url, cache_dir, None), path=snapshot_path(cache_dir, csv_url))
+    with open_csv(csv_url) as (stream, _, _):
+        return decode_outfit_catalog(stream, previous)
+
+async def load_sources_async(sources: dict, cache_dir: str = None, previous: dict = None,
+                             snapshots: dict = None) -> dict:
+    """
+    Loads several sources at once. `sources` maps each source to its score columns
+    (None for the outfit dataset); the result maps it to a score map or a Catalog.
+    Remote sources without a usable snapshot are downloaded concurrently over one
+    HTTP client into spools, then every source is decoded off the event loop, one at
+    a time and streaming. `previous` optionally maps outfit sources to their
+    last loaded Catalog, which is then updated incrementally rather than rebuilt.
+    With a `cache_dir`, missing snapshots are created under the same per-source lock
+    as _load_cached, so of several workers starting at once only the first fetches,
+    and `snapshots`, if given, is filled with the metadata header of the snapshot
+    each source was loaded from (see SnapshotRefresher).
+    """
+    previous = previous or {}
+    snapshots = {} if snapshots is None else snapshots
+    loaded = {}
+    missing = []
+    for source, col_names in sources.items():
+        col_names = list(col_names) if col_names is not None else None
+        cached = _read_cached(cache_dir, source) if cache_dir else None
+        if _usable(cached, col_names):
+            loaded[source] = _from_arrays(cached[0], source, cache_dir, col_names)
+            snapshots[source] = cached[1]
+        else:
+            missing.append((source, col_names))
+    with ExitStack() as locks:
+        pending = []
+        # Locks are taken in one order in every process, so workers cannot deadlock
+        for source, col_names in sorted(missing, key=lambda item: item[0]):
+            if cache_dir:
+                await asyncio.to_thread(locks.enter_context, _snapshot_lock(cache_dir, source))
+                # Another worker may have written it while this one waited
+                cached = _read_cached(cache_dir, source)
+                if _usable(cached, col_names):
+                    loaded[source] = _from_arrays(cached[0], source, cache_dir, col_names)
+                    snapshots[source] = cached[1]
+                    continue
+            pending.append((source, col_names))
+        if pending:
+            remote = [source for source, _ in pending if _local_path(source) is None]
+            spooled = {}
+            if remote:
+                import httpx
+                async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT, follow_redirects=True) as client:
+                    fetched = await asyncio.gather(*(spool_csv_async(client, source) for source in remote))
+                spooled = dict(zip(remote, fetched))
+            for source, col_names in pending:
+                loaded[source], meta = await asyncio.to_thread(
+                    _decode_fetched, source, cache_dir, col_names, spooled.get(source), previous.get(source)
+                )
+                if meta is not None:
+                    snapshots[source] = meta
+    return loaded
+
+def _decode_fetched(source, cache_dir, col_names, spooled=None, previous=None):
+    # (decoded source, snapshot meta or None without a cache). `spooled` is
+    # spool_csv_async's result for a remote source; local ones are read in place
+    with (open_csv(source) if spooled is None else _spooled_csv(spooled)) as (stream, etag, last_modified):
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            _store_snapshot(source, cache_dir, col_names, stream, etag, last_modified, previous)
+            # Re-read so the result is backed by the shared file, not this process's copy
+            arrays, meta = read_snapshot(snapshot_path(cache_dir, source))
+            return _from_arrays(arrays, source, cache_dir, col_names), meta
+        if col_names is not None:
+            return parse_score_map(stream, col_names), None
+        return decode_outfit_catalog(stream, previous), None
+
+def _from_arrays(arrays, source, cache_dir, col_names):
+    if col_names is not None:
+        return _score_map_from_arrays(arrays, col_names)
+    return Catalog(arrays, path=snapshot_path(cache_dir, source))
+
+class SnapshotRefresher(threading.Thread):
+    """
+    Daemon thread that refreshes snapshots every `interval` seconds.
+    `sources` maps each source to its score columns (None for the outfit dataset).
+    `served()` returns the snapshot metadata the data in use was loaded from (as
+    load_sources_async fills it in); without it, the previous pass's is used. After
+    each pass, `on_change(sources)` is called with the sources whose snapshot on
+    disk differs from that, if any: whichever process rewrote them, every process
+    sharing the cache directory reloads.
+    """
+
+    def __init__(self, sources: dict, cache_dir: str, interval: float = 300, on_change=None, served=None):
+        super().__init__(name="snapshot-refresher", daemon=True)
+        self.sources = sources
+        self.cache_dir = cache_dir
+        self.interval = interval
+        self.on_change = on_change
+        self.served = served
+        self._stopped = threading.Event()
+
+    def run(self):
+        seen = self._on_disk()
+        while not self._stopped.wait(self.interval):
+            refresh_snapshots(self.sources, self.cache_dir)
+            served = self.served() if self.served is not None else seen
+            seen = self._on_disk()
+            changed = [source for source in self.sources if seen[source] != served.get(source)]
+            if changed and self.on_change is not None:
+                self.on_change(changed)
+
+    def _on_disk(self):
+        return {source: snapshot_meta(self.cache_dir, source) for source in self.sources}
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,205 @@
+"""
+Incremental catalog updates keyed on image_label.
+
+Every catalog row built from CSV keeps a 64-bit digest of its source line (salted
+with the header, so a header change touches every row). Comparing digest arrays
+finds the lines that were added, changed or removed in one vectorized pass; only
+those lines are decoded. A CatalogDelta is applied in place: changed rows keep their
+position, removed rows are dropped and new rows are appended, so row order (and
+with it tie-breaking) stays stable across updates.
+"""
+import hashlib
+import io
+from itertools import islice
+
+import numpy as np
+
+from .catalog import Catalog, encode_outfits, gender_codes
+from .snapshot import edit_strings
+
+# Data lines digested (and diffed) per step when reading a stream
+CHUNK_ROWS = 65536
+
+
+def strip_newline(line: str) -> str:
+    """`line` without its line ending."""
+    if line.endswith("\r\n"):
+        return line[:-2]
+    if line.endswith(("\n", "\r")):
+        return line[:-1]
+    return line
+
+
+def data_lines(lines) -> tuple:
+    """
+    Splits CSV `lines` (a text stream opened with newline='', or text) into the
+    header and an iterator over the non-blank data lines, without line endings.
+    """
+    if isinstance(lines, str):
+        lines = io.StringIO(lines, newline="")
+    lines = (strip_newline(line) for line in lines)
+    return next(lines, ""), (line for line in lines if line)
+
+
+def chunks(iterable, size: int):
+    """Lists of up to `size` consecutive items."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def row_digests(header: str, rows: list) -> np.ndarray:
+    """Stable 64-bit digest of every data line, salted with the header."""
+    salted = hashlib.blake2b(header.encode("utf-8"), digest_size=8)
+    digests = np.empty(len(rows), dtype=np.uint64)
+    for i, line in enumerate(rows):
+        h = salted.copy()
+        h.update(line.encode("utf-8"))
+        digests[i] = int.from_bytes(h.digest(), "little")
+    return digests
+
+
+class CatalogDelta:
+    """
+    Differences between a catalog and its next version. `removed` and `changed` are
+    sorted row ids in the old catalog; changed rows get `changed_outfits`, and
+    `added_outfits` go to the end. Digests accompany the outfits.
+    """
+    __slots__ = ('removed', 'changed', 'changed_outfits', 'changed_digests', 'added_outfits', 'added_digests')
+
+    def __init__(self, removed, changed, changed_outfits, changed_digests, added_outfits, added_digests):
+        self.removed = np.asarray(removed, dtype=np.intp)
+        self.changed = np.asarray(changed, dtype=np.intp)
+        self.changed_outfits = changed_outfits
+        self.changed_digests = np.asarray(changed_digests, dtype=np.uint64)
+        self.added_outfits = added_outfits
+        self.added_digests = np.asarray(added_digests, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.removed) + len(self.changed) + len(self.added_outfits)
+
+    def row_map(self, size: int) -> np.ndarray:
+        """Old row id -> new row id, -1 for removed rows, for a catalog of `size` rows."""
+        keep = np.ones(size, dtype=bool)
+        keep[self.removed] = False
+        return np.where(keep, np.cumsum(keep) - 1, -1)
+
+    @classmethod
+    def from_lines(cls, catalog: Catalog, lines, parse, chunk_rows: int = CHUNK_ROWS):
+        """
+        Delta turning `catalog` into the outfit CSV `lines` (a text stream or text),
+        decoding only new or edited lines with `parse` (CSV lines -> outfits). Lines
+        are digested `chunk_rows` at a time; only the new ones are kept. None if the
+        catalog has no digests or the lines cannot be diffed line by line.
+        """
+        if catalog.digests is None:
+            return None
+        known = np.sort(catalog.digests)
+        header, rows = data_lines(lines)
+        digests, fresh_rows, fresh_digests = [], [], []
+        for chunk in chunks(rows, chunk_rows):
+            chunk_digests = row_digests(header, chunk)
+            fresh = np.flatnonzero(~_contains(known, chunk_digests))
+            fresh_rows.extend(chunk[i] for i in fresh.tolist())
+            fresh_digests.append(chunk_digests[fresh])
+            digests.append(chunk_digests)
+        digests = np.concatenate(digests) if digests else np.empty(0, dtype=np.uint64)
+        parsed = parse([header] + fresh_rows)
+        if len(parsed) != len(fresh_rows):
+            return None
+        gone = np.flatnonzero(~_contains(np.sort(digests), catalog.digests))
+        delta = cls._match(catalog, gone, parsed, np.concatenate(fresh_digests) if fresh_digests else [])
+        # Duplicate lines collapse in a line diff; the caller decodes in full then
+        if len(catalog) - len(delta.removed) + len(delta.added_outfits) != len(digests):
+            return None
+        return delta
+
+    @classmethod
+    def between(cls, old: Catalog, new: Catalog):
+        """
+        Delta from `old` to `new`, or None unless `new` is `old` updated in place
+        (e.g. a snapshot written by apply_delta from it).
+        """
+        if old.digests is None or new.digests is None:
+            return None
+        gone = np.flatnonzero(~np.isin(old.digests, new.digests))
+        fresh = np.flatnonzero(~np.isin(new.digests, old.digests))
+        delta = cls._match(old, gone, [new[row] for row in fresh], new.digests[fresh])
+        # The row layout must be exactly what applying the delta produces
+        keep = delta.row_map(len(old)) >= 0
+        expected = old.digests.copy()
+        expected[delta.changed] = delta.changed_digests
+        expected = np.concatenate((expected[keep], delta.added_digests))
+        if not np.array_equal(expected, new.digests):
+            return None
+        return delta
+
+    @classmethod
+    def _match(cls, catalog, gone, outfits, digests):
+        # Lines that vanished and lines that appeared pair up by image_label
+        rows_by_label = {}
+        for row in gone.tolist():
+            rows_by_label.setdefault(catalog.label(row), []).append(row)
+        changed = {}
+        added, added_digests = [], []
+        for outfit, digest in zip(outfits, digests):
+            rows = rows_by_label.get(outfit.image_label)
+            if rows:
+                changed[rows.pop(0)] = (outfit, digest)
+            else:
+                added.append(outfit)
+                added_digests.append(digest)
+        removed = sorted(row for rows in rows_by_label.values() for row in rows)
+        changed_rows = sorted(changed)
+        return cls(
+            removed,
+            changed_rows,
+            [changed[row][0] for row in changed_rows],
+            [changed[row][1] for row in changed_rows],
+            added,
+            added_digests,
+        )
+
+
+def _contains(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # np.isin without re-sorting the (large, reused) haystack for every chunk
+    at = np.searchsorted(sorted_values, values)
+    found = np.zeros(len(values), dtype=bool)
+    inside = at < len(sorted_values)
+    found[inside] = sorted_values[at[inside]] == values[inside]
+    return found
+
+
+def apply_delta(catalog: Catalog, delta: CatalogDelta) -> Catalog:
+    """New catalog with `delta` applied; `catalog` itself is left untouched."""
+    keep = np.ones(len(catalog), dtype=bool)
+    keep[delta.removed] = False
+    codes = np.array(catalog.codes)
+    genders = np.array(catalog.gender_codes)
+    digests = np.array(catalog.digests)
+    urls = {}
+    if len(delta.changed):
+        codes[delta.changed] = encode_outfits(delta.changed_outfits)
+        genders[delta.changed] = gender_codes(delta.changed_outfits)
+        digests[delta.changed] = delta.changed_digests
+        # Labels are the key, so only URLs can differ
+        urls = {
+            row: outfit.image_url
+            for row, outfit in zip(delta.changed.tolist(), delta.changed_outfits)
+            if outfit.image_url != catalog.url(row)
+        }
+    added = delta.added_outfits
+    arrays = catalog.arrays()
+    label_blob, label_offsets = edit_strings(
+        arrays['label_blob'], arrays['label_offsets'], keep, append=[o.image_label for o in added]
+    )
+    url_blob, url_offsets = edit_strings(
+        arrays['url_blob'], arrays['url_offsets'], keep, replace=urls, append=[o.image_url for o in added]
+    )
+    return Catalog({
+        'codes': np.concatenate((codes[keep], encode_outfits(added).reshape(len(added), codes.shape[1]))),
+        'gender_codes': np.concatenate((genders[keep], gender_codes(added))),
+        'label_blob': label_blob, 'label_offsets': label_offsets,
+        'url_blob': url_blob, 'url_offsets': url_offsets,
+        'row_digests': np.concatenate((digests[keep], delta.added_digests)),
+    })
@@ -0,0 +1,51 @@
+"""
+Diversity re-ranking (maximal marginal relevance) of recommendations.
+
+Near-duplicate outfits, the same attributes under different images, score the same,
+so a plain top-k can repeat one look. With a `diversity` weight in (0, 1], the best
+`shortlist_size(topk)` results are re-ranked greedily; each pick maximises
+
+    (1 - diversity) * relevance - diversity * (highest similarity to an earlier pick)
+
+where relevance is the score rescaled to [0, 1] over the shortlist and similarity is
+the share of attribute codes two outfits have in common. The first pick is always
+the best-scoring outfit. Cost is O(shortlist x topk x attributes), whatever the
+catalog size, and a greedy pick order makes shorter result lists prefixes of longer
+ones over the same shortlist.
+"""
+import numpy as np
+
+from .catalog import encode_outfits
+
+# Candidates considered for re-ranking, at least topk
+SHORTLIST_SIZE = 50
+
+
+def shortlist_size(topk: int) -> int:
+    """Results to select by score before diversify() re-ranks them down to `topk`."""
+    return max(topk, SHORTLIST_SIZE)
+
+
+def diversify(results: list, topk: int, diversity: float) -> list:
+    """
+    Top `topk` of `results` (recommendation dicts, best score first) re-ranked by
+    maximal marginal relevance; the first `topk` unchanged when `diversity` is 0.
+    """
+    if diversity <= 0 or len(results) <= 1:
+        return results[:topk]
+    codes = encode_outfits([result['outfit'] for result in results])
+    scores = np.array([result['score'] for result in results], dtype=np.float64)
+    spread = scores.max() - scores.min()
+    relevance = (scores - scores.min()) / spread if spread > 0 else np.ones(len(results))
+    relevance *= 1.0 - diversity
+    # Highest similarity of each candidate to the outfits picked so far
+    nearest = np.zeros(len(results))
+    picked = []
+    for _ in range(min(topk, len(results))):
+        gain = relevance - diversity * nearest
+        gain[picked] = -np.inf
+        # argmax keeps the better-ranked candidate on ties
+        i = int(np.argmax(gain))
+        picked.append(i)
+        np.maximum(nearest, (codes == codes[i]).mean(axis=1), out=nearest)
+    return [results[i] for i in picked]
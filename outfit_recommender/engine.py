@@ -0,0 +1,169 @@
+"""
+Compiled scoring engine.
+
+The outfit catalog is encoded once as an integer code matrix (outfits x attributes)
+and every score map is compiled into dense per-category lookup tables, so style and
+body shape scores for the whole catalog come from a single gather-and-sum.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from .attribute_mapping import ATTRIBUTE_CODE_MAPS, STYLE_NAMES, BODYSHAPE_NAMES, GENDER_NAMES
+from .catalog import Catalog, ATTRIBUTE_NAMES, ATTRIBUTE_OFFSETS, TABLE_WIDTH
+from .index import feature_codes
+from .soscoring import SEASON_TABLE, OCCASION_TABLE
+
+
+def compile_score_map(score_map: dict, categories: list, attr_weights=None) -> np.ndarray:
+    """
+    Compiles a nested score map (attr -> value -> category -> score) into a dense
+    (categories x TABLE_WIDTH) float table, with attribute weights folded in.
+    """
+    if attr_weights is None:
+        attr_weights = defaultdict(lambda: 1.0)
+    table = np.zeros((len(categories), TABLE_WIDTH), dtype=np.float64)
+    for col, attr in enumerate(ATTRIBUTE_NAMES):
+        if attr not in score_map:
+            continue
+        weight = attr_weights[attr]
+        offset = ATTRIBUTE_OFFSETS[col]
+        for code, value in ATTRIBUTE_CODE_MAPS[attr].items():
+            scores = score_map[attr].get(value, {})
+            for i, cat in enumerate(categories):
+                table[i, offset + int(code)] = scores.get(cat, 0) * weight
+    return table
+
+
+def score_codes(codes: np.ndarray, table_row: np.ndarray) -> np.ndarray:
+    """Scores every row of a code matrix against one compiled category row."""
+    return table_row[codes.astype(np.intp) + ATTRIBUTE_OFFSETS].sum(axis=1)
+
+
+class ScoreEngine:
+    """
+    Outfit catalog with its code matrix and compiled style/body shape tables.
+    Build once at startup and reuse for every request.
+    """
+
+    def __init__(self, outfits, style_score_map, bodyshape_score_map, attr_weights=None,
+                 season_rules=SEASON_TABLE, occasion_rules=OCCASION_TABLE):
+        # `outfits` is a Catalog (possibly attached to a shared snapshot) or a list of outfit dicts
+        self.outfits = outfits if isinstance(outfits, Catalog) else Catalog.from_outfits(list(outfits))
+        self.codes = self.outfits.codes
+        self.style_table = compile_score_map(style_score_map, STYLE_NAMES, attr_weights)
+        self.bodyshape_table = compile_score_map(bodyshape_score_map, BODYSHAPE_NAMES, attr_weights)
+        self.gender_codes = self.outfits.gender_codes
+        # Season/occasion RuleTables (see soscoring.py)
+        self.season_rules = season_rules
+        self.occasion_rules = occasion_rules
+        self._season_scores = {}
+        self._occasion_scores = {}
+        self._feature_masks = {}
+
+    def with_catalog(self, outfits) -> "ScoreEngine":
+        """Engine for another catalog (e.g. after a delta) sharing these compiled tables."""
+        engine = object.__new__(ScoreEngine)
+        engine.outfits = outfits
+        engine.codes = outfits.codes
+        engine.style_table = self.style_table
+        engine.bodyshape_table = self.bodyshape_table
+        engine.gender_codes = outfits.gender_codes
+        engine.season_rules = self.season_rules
+        engine.occasion_rules = self.occasion_rules
+        engine._season_scores = {}
+        engine._occasion_scores = {}
+        engine._feature_masks = {}
+        return engine
+
+    def with_weights(self, style_score_map, bodyshape_score_map, attr_weights) -> "ScoreEngine":
+        """
+        Engine for the same catalog with the score maps compiled under other attribute
+        weights. Season/occasion scores and feature masks do not depend on the weights,
+        so their caches are shared with this engine.
+        """
+        engine = object.__new__(ScoreEngine)
+        engine.outfits = self.outfits
+        engine.codes = self.codes
+        engine.style_table = compile_score_map(style_score_map, STYLE_NAMES, attr_weights)
+        engine.bodyshape_table = compile_score_map(bodyshape_score_map, BODYSHAPE_NAMES, attr_weights)
+        engine.gender_codes = self.gender_codes
+        engine.season_rules = self.season_rules
+        engine.occasion_rules = self.occasion_rules
+        engine._season_scores = self._season_scores
+        engine._occasion_scores = self._occasion_scores
+        engine._feature_masks = self._feature_masks
+        return engine
+
+    def __len__(self):
+        return len(self.outfits)
+
+    def gender_rows(self, gender: str) -> np.ndarray:
+        """Row indices of outfits for the given gender, including unisex outfits."""
+        unisex = self.gender_codes == GENDER_NAMES.index("unisex")
+        if gender not in GENDER_NAMES:
+            return np.flatnonzero(unisex)
+        return np.flatnonzero((self.gender_codes == GENDER_NAMES.index(gender)) | unisex)
+
+    def _scores(self, table, names, category, rows):
+        codes = self.codes if rows is None else self.codes[rows]
+        if category not in names:
+            return np.zeros(len(codes), dtype=np.float64)
+        return score_codes(codes, table[names.index(category)])
+
+    def style_scores(self, style: str, rows=None) -> np.ndarray:
+        return self._scores(self.style_table, STYLE_NAMES, style, rows)
+
+    def bodyshape_scores(self, body_shape: str, rows=None) -> np.ndarray:
+        return self._scores(self.bodyshape_table, BODYSHAPE_NAMES, body_shape, rows)
+
+    def season_scores(self, season):
+        """Raw season score of every outfit, or None if no rule covers `season`."""
+        return self._rule_scores(self.season_rules, self._season_scores, season)[0]
+
+    def occasion_scores(self, occasion):
+        """Raw occasion score of every outfit, or None if no rule covers `occasion`."""
+        return self._rule_scores(self.occasion_rules, self._occasion_scores, occasion)[0]
+
+    def season_bound(self, season):
+        """Highest raw season score any outfit in the catalog can reach."""
+        return self._rule_scores(self.season_rules, self._season_scores, season)[1]
+
+    def occasion_bound(self, occasion):
+        """Highest raw occasion score any outfit in the catalog can reach."""
+        return self._rule_scores(self.occasion_rules, self._occasion_scores, occasion)[1]
+
+    def _rule_scores(self, rules, cache, name):
+        # (scores, max) per rule group, computed for the whole catalog on first use
+        group = rules.group(name)
+        if group is None:
+            return None, 0.0
+        if group not in cache:
+            scores = score_codes(self.codes, rules.table[group])
+            cache[group] = (scores, float(scores.max(initial=0.0)))
+        return cache[group]
+
+    def feature_matches(self, features: dict, rows=None) -> np.ndarray:
+        """
+        How many of the prompt `features` (feature -> keyword) each outfit has, for
+        `rows` or the whole catalog. A feature matches on its own attributes only
+        (see FEATURE_ATTRIBUTES): cotton on a fabric, not in some other column.
+        """
+        counts = np.zeros(len(self) if rows is None else len(rows), dtype=np.intp)
+        for feature, keyword in features.items():
+            mask = self._feature_mask(feature, keyword)
+            if mask is not None:
+                counts += mask if rows is None else mask[rows]
+        return counts
+
+    def _feature_mask(self, feature, keyword):
+        # Boolean mask per (feature, keyword) over the catalog, or None if the
+        # keyword names no attribute value; the keyword vocabulary is small and fixed
+        key = (feature, keyword.lower())
+        if key not in self._feature_masks:
+            mask = None
+            for col, code in feature_codes(feature, keyword):
+                hits = self.codes[:, col] == code
+                mask = hits if mask is None else mask | hits
+            self._feature_masks[key] = mask
+        return self._feature_masks[key]
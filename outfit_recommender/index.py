@@ -0,0 +1,91 @@
+"""
+Inverted attribute index.
+
+Maps every (attribute, value) pair and every gender to a packed bitset of outfit rows,
+so filters such as "male + cotton + short sleeve" become bitset intersections.
+"""
+import numpy as np
+
+from .attribute_mapping import ATTRIBUTE_CODE_MAPS, GENDER_NAMES, FEATURE_ATTRIBUTES
+from .catalog import ATTRIBUTE_NAMES, VALUE_CODES
+
+FEATURE_MODES = ("boost", "filter")
+
+
+def feature_value(attr: str, keyword: str):
+    """Attribute value matching a prompt feature keyword (case-insensitive), or None."""
+    keyword = keyword.lower()
+    for value in ATTRIBUTE_CODE_MAPS[attr].values():
+        if value.lower() == keyword:
+            return value
+    return None
+
+
+def feature_codes(feature: str, keyword: str) -> list:
+    """(column, code) pairs a prompt feature matches, e.g. cotton on each fabric attribute."""
+    pairs = []
+    for attr in FEATURE_ATTRIBUTES.get(feature, ()):
+        value = feature_value(attr, keyword)
+        if value is not None:
+            pairs.append((ATTRIBUTE_NAMES.index(attr), VALUE_CODES[attr][value]))
+    return pairs
+
+
+class AttributeIndex:
+    """Packed row bitsets per (attribute, value) and per gender of a Catalog."""
+
+    def __init__(self, catalog):
+        self.size = len(catalog)
+        self._empty = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self._bitsets = {}
+        for col, attr in enumerate(ATTRIBUTE_NAMES):
+            column = catalog.codes[:, col]
+            for code, value in ATTRIBUTE_CODE_MAPS[attr].items():
+                self._bitsets[(attr, value)] = np.packbits(column == int(code))
+        unisex = catalog.gender_codes == GENDER_NAMES.index("unisex")
+        self._genders = {
+            gender: np.packbits((catalog.gender_codes == code) | unisex)
+            for code, gender in enumerate(GENDER_NAMES)
+        }
+        self._unisex = np.packbits(unisex)
+
+    def bitset(self, attr: str, value: str) -> np.ndarray:
+        return self._bitsets.get((attr, value), self._empty)
+
+    def gender_bitset(self, gender: str) -> np.ndarray:
+        """Outfits for `gender`, including unisex ones."""
+        return self._genders.get(gender, self._unisex)
+
+    def feature_bitset(self, feature: str, keyword: str):
+        """
+        Outfits matching one prompt feature on any of its attributes (e.g. cotton on
+        any fabric), or None if the feature has no structured attribute to match.
+        """
+        bits = None
+        for attr in FEATURE_ATTRIBUTES.get(feature, ()):
+            value = feature_value(attr, keyword)
+            if value is None:
+                continue
+            bits = self.bitset(attr, value) if bits is None else bits | self.bitset(attr, value)
+        return bits
+
+    def query(self, gender: str = None, features: dict = None, attributes: dict = None) -> np.ndarray:
+        """Intersection of the gender, feature and exact (attr -> value) filters, as a packed bitset."""
+        bits = self.gender_bitset(gender) if gender is not None else None
+        for feature, keyword in (features or {}).items():
+            feature_bits = self.feature_bitset(feature, keyword)
+            if feature_bits is not None:
+                bits = feature_bits if bits is None else bits & feature_bits
+        for attr, value in (attributes or {}).items():
+            bits = self.bitset(attr, value) if bits is None else bits & self.bitset(attr, value)
+        if bits is None:
+            return np.packbits(np.ones(self.size, dtype=bool))
+        return bits
+
+    def mask(self, bits: np.ndarray) -> np.ndarray:
+        """Unpacks a bitset into a boolean mask over catalog rows."""
+        return np.unpackbits(bits, count=self.size).astype(bool)
+
+    def rows(self, gender: str = None, features: dict = None, attributes: dict = None) -> np.ndarray:
+        """Sorted row ids passing all filters (see query)."""
+        return np.flatnonzero(self.mask(self.query(gender, features, attributes)))
@@ -0,0 +1,188 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Stages of a recommendation are timed with two calls:
+
+    start = metrics.clock()
+    ...
+    start = metrics.observe("score", start)   # records and restarts the clock
+
+Set OUTFIT_METRICS=0 (or call enable(False)) to turn the hooks off: clock() and
+observe() are then rebound to functions that do nothing, so instrumented code pays
+one call per hook. Scoring worker processes forward their observations to the
+server process instead of keeping their own histograms (see forward/take/replay).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; scoring stages run from microseconds to a few hundred milliseconds
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+COUNT_BUCKETS = (0, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by one label."""
+
+    def __init__(self, name: str, documentation: str, buckets=LATENCY_BUCKETS, label: str = None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label = label
+        # label value -> [per-bucket counts (+Inf last), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label_value: str = None):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(counts), total) for k, (counts, total) in self._series.items())
+        for label_value, counts, total in series:
+            labels = f'{self.label}="{label_value}"' if self.label else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{labels + "," if labels else ""}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge or counter read at scrape time from `collect`, which returns a number or,
+    with a `label`, a dict of label value -> number.
+    """
+
+    def __init__(self, name: str, documentation: str, collect, kind: str = "gauge", label: str = None):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.kind = kind
+        self.label = label
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        values = self.collect()
+        if self.label is None:
+            if values is not None:
+                lines.append(f"{self.name} {values}")
+        else:
+            for label_value, value in sorted(values.items()):
+                lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        # Re-registering a name (e.g. on module reload) replaces the old metric
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str):
+        return self._metrics[name]
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "outfit_stage_seconds", "Time spent in each stage of serving a recommendation.", label="stage",
+))
+CANDIDATES = REGISTRY.register(Histogram(
+    "outfit_candidates", "Outfits left to score after gender and feature filtering.", buckets=COUNT_BUCKETS,
+))
+
+# Observations made while forwarding (in scoring workers), waiting for take()
+_forwarded = None
+
+
+def _record(histogram, value, label_value=None):
+    if _forwarded is not None:
+        _forwarded.append((histogram.name, value, label_value))
+    else:
+        histogram.observe(value, label_value)
+
+
+def _clock() -> float:
+    return time.perf_counter()
+
+
+def _observe(stage: str, start: float) -> float:
+    now = time.perf_counter()
+    _record(STAGE_SECONDS, now - start, stage)
+    return now
+
+
+def _observe_candidates(count: int):
+    _record(CANDIDATES, count)
+
+
+def _off_clock() -> float:
+    return 0.0
+
+
+def _off_observe(stage: str, start: float) -> float:
+    return 0.0
+
+
+def _off_observe_candidates(count: int):
+    pass
+
+
+def enable(enabled: bool = True):
+    """Turns the timing hooks on or off for this process."""
+    global ENABLED, clock, observe, observe_candidates
+    ENABLED = enabled
+    if enabled:
+        clock, observe, observe_candidates = _clock, _observe, _observe_candidates
+    else:
+        clock, observe, observe_candidates = _off_clock, _off_observe, _off_observe_candidates
+
+
+def forward():
+    """Keeps this process's observations for take() instead of recording them."""
+    global _forwarded
+    _forwarded = []
+
+
+def take() -> list:
+    """Observations made since the last take(), to be replay()ed in another process."""
+    global _forwarded
+    if not _forwarded:
+        return []
+    taken, _forwarded = _forwarded, []
+    return taken
+
+
+def replay(observations: list):
+    """Records observations taken in another process."""
+    for name, value, label_value in observations:
+        REGISTRY.get(name).observe(value, label_value)
+
+
+ENABLED = True
+clock = observe = observe_candidates = None
+enable(os.environ.get("OUTFIT_METRICS", "1").lower() not in ("0", "false", "no", "off"))
@@ -1,10 +1,29 @@
-import spacy
+import re
+import threading
 from .attribute_mapping import (
     STYLE_NAMES, BODYSHAPE_NAMES, SEASON_NAMES, OCCASION_NAMES
 )
+from .cache import LRUCache
 
-# Load spaCy (ensure 'en_core_web_sm' is installed)
-nlp = spacy.load("en_core_web_sm")
+SPACY_MODEL = "en_core_web_sm"
+# Only the entity recognizer is used; the rest of the pipeline is never loaded
+_NON_NER_PIPES = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+
+_nlp = None
+_nlp_lock = threading.Lock()
+
+def get_nlp():
+    """Loads the spaCy model (NER only) on first use and shares it afterwards."""
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                # spaCy itself takes most of a second to import, and keyword prompts
+                # never need it, so it is imported here rather than with this module.
+                # Ensure 'en_core_web_sm' is installed
+                import spacy
+                _nlp = spacy.load(SPACY_MODEL, exclude=_NON_NER_PIPES)
+    return _nlp
 
 FEATURE_KEYWORDS = {
     'sleeve': ['short sleeve', 'long sleeve', 'sleeveless', 'medium sleeve', 'not long sleeve'],
@@ -28,26 +47,76 @@ def extract_feature_entities(text, features_map):
                 features[feature] = val
     return features
 
+class KeywordMatcher:
+    """
+    Finds every vocabulary keyword occurring as a substring of a text in one regex
+    pass. Gives the same answers as extract_entity/extract_feature_entities.
+    """
+
+    def __init__(self, vocabularies: dict, features_map: dict):
+        # vocabularies: name -> keyword list, where the first listed keyword present wins
+        self.vocabularies = {name: list(words) for name, words in vocabularies.items()}
+        self.features_map = features_map
+        keywords = {w.lower() for words in vocabularies.values() for w in words}
+        keywords |= {v for vals in features_map.values() for v in vals}
+        # Longest first, so each position reports its longest keyword; the shorter ones
+        # starting at the same position are exactly its prefixes
+        ordered = sorted(keywords, key=len, reverse=True)
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in ordered) + "))")
+        self._prefixes = {k: [p for p in keywords if k.startswith(p)] for k in keywords}
+
+    def present(self, text: str) -> set:
+        found = set()
+        for match in self._pattern.finditer(text.lower()):
+            found.update(self._prefixes[match.group(1)])
+        return found
+
+    def match(self, text: str) -> dict:
+        found = self.present(text)
+        result = {
+            name: next((w for w in words if w.lower() in found), None)
+            for name, words in self.vocabularies.items()
+        }
+        features = {}
+        for feature, vals in self.features_map.items():
+            for val in vals:
+                if val in found:
+                    features[feature] = val
+        result['features'] = features
+        return result
+
+_matcher = KeywordMatcher(
+    {'style': STYLE_NAMES, 'season': SEASON_NAMES, 'occasion': OCCASION_NAMES},
+    FEATURE_KEYWORDS,
+)
+
 def parse_prompt(prompt):
-    doc = nlp(prompt)
-    text = prompt.lower()
-    # Find style
-    style = extract_entity(text, STYLE_NAMES)
-    # Find season
-    season = extract_entity(text, SEASON_NAMES)
-    # Find occasion
-    occasion = extract_entity(text, OCCASION_NAMES)
-    # Features (expandable)
-    features = extract_feature_entities(text, FEATURE_KEYWORDS)
+    # Keyword fast path; spaCy only runs when no occasion keyword is present
+    parsed = _matcher.match(prompt)
+    occasion = parsed['occasion']
     # Fallback: NER for event/occasion if not captured
     if not occasion:
-        for ent in doc.ents:
+        for ent in get_nlp()(prompt).ents:
             if ent.label_ == "EVENT":
                 occasion = ent.text
                 break
     return {
-        "style": style,
-        "season": season,
+        "style": parsed['style'],
+        "season": parsed['season'],
         "occasion": occasion,
-        "features": features
-    }
\ No newline at end of file
+        "features": parsed['features']
+    }
+
+# Parsed intents for recently seen prompts; parsing does not depend on the catalog
+PROMPT_CACHE = LRUCache(maxsize=4096, ttl=3600)
+
+def normalize_prompt(prompt):
+    """Collapses whitespace; prompts that normalize equally share a cache entry."""
+    return " ".join(prompt.split())
+
+def parse_prompt_cached(prompt):
+    """parse_prompt on the normalized prompt, memoized in PROMPT_CACHE."""
+    text = normalize_prompt(prompt)
+    parsed = PROMPT_CACHE.get_or_compute(text, lambda: parse_prompt(text))
+    # Callers get their own copy, so cached entries cannot be mutated
+    return dict(parsed, features=dict(parsed['features']))
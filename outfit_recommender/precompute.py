@@ -0,0 +1,161 @@
+"""
+Precomputed per-(style, body shape, gender) score tables.
+
+There are only a handful of styles, body shapes and genders, so the style and body
+shape part of the combined score is computed ahead of time for every bucket and kept
+as a ranked shortlist. Requests then only rescore the season/occasion/feature delta
+on the head of that shortlist.
+"""
+import numpy as np
+
+from .attribute_mapping import STYLE_NAMES, BODYSHAPE_NAMES, GENDER_NAMES
+
+# Number of ranked candidates kept per bucket
+SHORTLIST_SIZE = 256
+
+
+class ScoreBucket:
+    """Ranked shortlist for one (style, body shape, gender) combination."""
+    __slots__ = ('rows', 'style_scores', 'bodyshape_scores', 'base_scores', 'eligible', 'complete')
+
+    def __init__(self, rows, style_scores, bodyshape_scores, base_scores, eligible):
+        self.rows = rows
+        self.style_scores = style_scores
+        self.bodyshape_scores = bodyshape_scores
+        self.base_scores = base_scores
+        # Number of outfits in the bucket that pass the style threshold
+        self.eligible = eligible
+        # True when the shortlist holds every eligible outfit
+        self.complete = len(rows) == eligible
+
+
+class ScoreTables:
+    """
+    Precomputed style/body shape rankings for every (style, body shape, gender) bucket
+    of a ScoreEngine. Build once after the data is loaded.
+    """
+
+    def __init__(self, engine, shortlist=SHORTLIST_SIZE):
+        self.engine = engine
+        self.shortlist = shortlist
+        self.buckets = {}
+
+        style_scores = {s: engine.style_scores(s) for s in STYLE_NAMES}
+        bs_scores = {b: _penalized(engine.bodyshape_scores(b)) for b in BODYSHAPE_NAMES}
+
+        for gender in GENDER_NAMES:
+            rows = engine.gender_rows(gender)
+            for style in STYLE_NAMES:
+                s = style_scores[style][rows]
+                keep = s >= 0.3
+                kept_rows = rows[keep]
+                kept_style = s[keep]
+                for body_shape in BODYSHAPE_NAMES:
+                    self.buckets[(style, body_shape, gender)] = _rank(
+                        kept_rows, kept_style, bs_scores[body_shape][kept_rows], shortlist
+                    )
+
+    def bucket(self, style, body_shape, gender):
+        return self.buckets.get((style, body_shape, gender))
+
+    def updated(self, engine, delta) -> "ScoreTables":
+        """
+        Tables for `engine`, whose catalog is this one's with a CatalogDelta applied
+        (see delta.py). Only the rows the delta touches are scored; every shortlist
+        stays an exact prefix of its bucket's ranking.
+        """
+        old_engine = self.engine
+        size = len(old_engine)
+        row_map = delta.row_map(size)
+        leaving = np.concatenate((delta.removed, delta.changed))
+        first_added = len(engine) - len(delta.added_outfits)
+        entering = np.concatenate((row_map[delta.changed], np.arange(first_added, len(engine))))
+        dropped = np.zeros(size, dtype=bool)
+        dropped[leaving] = True
+        # Position of every old row in the new catalog; a removed row sits just
+        # before the row that followed it
+        position = np.where(row_map >= 0, row_map, np.arange(size) - np.cumsum(row_map < 0) + 0.5)
+
+        unisex = GENDER_NAMES.index("unisex")
+        old_genders = old_engine.gender_codes[leaving]
+        new_genders = engine.gender_codes[entering]
+        old_style = {s: old_engine.style_scores(s, leaving) for s in STYLE_NAMES}
+        new_style = {s: engine.style_scores(s, entering) for s in STYLE_NAMES}
+        new_bs = {b: _penalized(engine.bodyshape_scores(b, entering)) for b in BODYSHAPE_NAMES}
+
+        tables = object.__new__(ScoreTables)
+        tables.engine = engine
+        tables.shortlist = self.shortlist
+        tables.buckets = {}
+        for code, gender in enumerate(GENDER_NAMES):
+            old_in = (old_genders == code) | (old_genders == unisex)
+            new_in = (new_genders == code) | (new_genders == unisex)
+            for style in STYLE_NAMES:
+                left = int(np.count_nonzero(old_in & (old_style[style] >= 0.3)))
+                joining = np.flatnonzero(new_in & (new_style[style] >= 0.3))
+                for body_shape in BODYSHAPE_NAMES:
+                    key = (style, body_shape, gender)
+                    s = new_style[style][joining]
+                    b = new_bs[body_shape][joining]
+                    candidates = list(zip(
+                        (-(s * 3.0 + b * 2.0)).tolist(), entering[joining].tolist(), s.tolist(), b.tolist()
+                    ))
+                    bucket = tables._merge(
+                        self.buckets[key], dropped, row_map, position, candidates,
+                        self.buckets[key].eligible - left + len(joining),
+                    )
+                    if bucket is None:
+                        bucket = tables._rebuild(style, body_shape, gender)
+                    tables.buckets[key] = bucket
+        return tables
+
+    def _merge(self, bucket, dropped, row_map, position, candidates, eligible):
+        # Entries are (-base, row, style, body shape), ordered like the bucket ranking
+        entries = [
+            (-base, int(row_map[row]), style, bs)
+            for row, style, bs, base in zip(bucket.rows, bucket.style_scores, bucket.bodyshape_scores, bucket.base_scores)
+            if not dropped[row]
+        ]
+        if bucket.complete:
+            entries.extend(candidates)
+        elif bucket.rows:
+            # Only outfits ranking above the old shortlist's last entry belong in the
+            # prefix; everything else stays beyond it
+            boundary = (-bucket.base_scores[-1], position[bucket.rows[-1]])
+            entries.extend(c for c in candidates if c[:2] < boundary)
+        else:
+            return None
+        entries.sort()
+        entries = entries[:self.shortlist]
+        if len(entries) < eligible and len(entries) < self.shortlist // 2:
+            # Removals wore the shortlist down; rank the bucket afresh
+            return None
+        return ScoreBucket(
+            [e[1] for e in entries], [e[2] for e in entries], [e[3] for e in entries],
+            [-e[0] for e in entries], eligible,
+        )
+
+    def _rebuild(self, style, body_shape, gender):
+        rows = self.engine.gender_rows(gender)
+        s = self.engine.style_scores(style, rows)
+        keep = s >= 0.3
+        kept_rows = rows[keep]
+        b = _penalized(self.engine.bodyshape_scores(body_shape, kept_rows))
+        return _rank(kept_rows, s[keep], b, self.shortlist)
+
+
+def _penalized(bs_scores):
+    return np.where(bs_scores < 0.2, bs_scores * 0.5, bs_scores)
+
+
+def _rank(kept_rows, kept_style, bs_scores, shortlist):
+    base = kept_style * 3.0 + bs_scores * 2.0
+    # Highest base score first, ties in catalog order
+    order = np.lexsort((kept_rows, -base))[:shortlist]
+    return ScoreBucket(
+        kept_rows[order].tolist(),
+        kept_style[order].tolist(),
+        bs_scores[order].tolist(),
+        base[order].tolist(),
+        len(kept_rows),
+    )
@@ -0,0 +1,93 @@
+"""
+Named attribute weight profiles.
+
+A profile maps attribute names to weights; attributes it leaves out weigh 1.0. It
+is compiled once, when registered: the style and body shape score maps are compiled
+again with its weights folded in (a ScoreEngine sharing the catalog, see
+ScoreEngine.with_weights) and the precomputed ScoreTables are ranked under them.
+A request naming the profile is then served from those tables exactly like a
+default request, so custom weighting costs nothing per request.
+"""
+import math
+from collections import defaultdict
+
+from .catalog import ATTRIBUTE_NAMES
+from .precompute import ScoreTables
+from .recommender import recommend_batch
+
+# Scores with the weights the ServingState was built with
+DEFAULT_PROFILE = "default"
+
+
+def validate_weights(weights: dict) -> dict:
+    """
+    Checks a profile's weights (attribute -> weight) and returns them as a plain
+    dict of floats. Raises ValueError for unknown attributes and for weights that
+    are negative or not finite.
+    """
+    unknown = sorted(set(weights) - set(ATTRIBUTE_NAMES))
+    if unknown:
+        raise ValueError(f"Unknown attributes: {', '.join(unknown)}")
+    checked = {}
+    for attr, weight in weights.items():
+        weight = float(weight)
+        if not math.isfinite(weight) or weight < 0:
+            raise ValueError(f"Weight of {attr} must be a finite number >= 0, got {weight}")
+        checked[attr] = weight
+    return checked
+
+
+def weights_key(weights: dict) -> tuple:
+    """Hashable identity of a profile's weights, e.g. for cache keys."""
+    return tuple(sorted(weights.items()))
+
+
+class WeightProfile:
+    """A named set of attribute weights with the engine and score tables compiled under it."""
+    __slots__ = ('name', 'weights', 'engine', 'tables', 'key')
+
+    def __init__(self, name, weights, engine, tables):
+        self.name = name
+        self.weights = weights
+        self.engine = engine
+        self.tables = tables
+        # Identifies the weights in cache keys, so re-registering a name never serves stale results
+        self.key = weights_key(weights)
+
+    @classmethod
+    def compile(cls, name, weights, engine, style_score_map, bodyshape_score_map) -> "WeightProfile":
+        """Compiles `weights` against `engine`'s catalog; the slow part, run when a profile is registered."""
+        engine = engine.with_weights(style_score_map, bodyshape_score_map, defaultdict(lambda: 1.0, weights))
+        return cls(name, weights, engine, ScoreTables(engine))
+
+    def updated(self, outfits, delta) -> "WeightProfile":
+        """This profile for `outfits`, its catalog with a CatalogDelta applied (see ScoreTables.updated)."""
+        engine = self.engine.with_catalog(outfits)
+        return WeightProfile(self.name, self.weights, engine, self.tables.updated(engine, delta))
+
+
+def profile_name(request: dict) -> str:
+    """Weight profile a request dict asks for."""
+    return request.get('weight_profile') or DEFAULT_PROFILE
+
+
+def recommend_batch_by_profile(requests, engine_for, index, default_style="Casual", parsed=None) -> list:
+    """
+    recommend_batch over requests that may name different weight profiles: each
+    profile's requests are batched on its engine (`engine_for(name)` returns it) and
+    the results come back in request order. `parsed` is passed on to recommend_batch.
+    """
+    positions = {}
+    for i, request in enumerate(requests):
+        positions.setdefault(profile_name(request), []).append(i)
+    if len(positions) == 1:
+        (name,) = positions
+        return recommend_batch(requests, engine_for(name), index=index, default_style=default_style, parsed=parsed)
+    results = [None] * len(requests)
+    for name, group in positions.items():
+        answers = recommend_batch(
+            [requests[i] for i in group], engine_for(name), index=index, default_style=default_style, parsed=parsed
+        )
+        for i, answer in zip(group, answers):
+            results[i] = answer
+    return results
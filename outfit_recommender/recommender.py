@@ -1,6 +1,12 @@
-from .scoring import score_outfit
-from .nlp_prompt_parser import parse_prompt
-from .soscoring import heuristic_season_score, heuristic_occasion_score
+import heapq
+
+import numpy as np
+
+from . import metrics
+from .diversity import diversify, shortlist_size
+from .engine import ScoreEngine
+from .index import AttributeIndex
+from .nlp_prompt_parser import parse_prompt_cached
 
 def recommend_best_combined(
     outfits,
@@ -14,84 +20,346 @@ def recommend_best_combined(
     season=None,
     occasion=None,
     features=None,
+    engine=None,
+    rows=None,
+    tables=None,
+    gender=None,
+    prune=True,
+    index=None,
+    feature_mode="boost",
+    diversity=0.0,
+    parsed=None,
 ):
+    # `engine` is a ScoreEngine compiled from `outfits`; `rows` optionally restricts
+    # scoring to a subset of its rows (e.g. a gender filter). With precomputed
+    # `tables` and a `gender`, the matching bucket is used instead of `rows` when it
+    # can answer the query on its own. `prune` stops scoring season and occasion once
+    # no remaining outfit can enter the top-k; results are the same either way.
+    # feature_mode "boost" rewards matching prompt features; "filter" also drops every
+    # outfit that misses one, using the AttributeIndex bitsets. A `diversity` weight
+    # above 0 selects a shortlist by score and re-ranks it for variety (see diversity.py).
+    # `parsed` is the prompt's parse_prompt_cached result when the caller already has it.
+    if engine is None:
+        engine = ScoreEngine(outfits, style_score_map, bodyshape_score_map, attr_weights)
+        rows = None
+    rows = np.arange(len(engine)) if rows is None else np.asarray(rows, dtype=np.intp)
+    shortlist = shortlist_size(topk) if diversity > 0 else topk
+
+    # Stage timings and candidate counts go to metrics (no-ops when disabled)
+    start = metrics.clock()
     # Parse prompt if not explicitly provided
     if not (style and body_shape and season and occasion and features):
-        parsed = parse_prompt(prompt)
+        if parsed is None:
+            parsed = parse_prompt_cached(prompt)
         style = style or parsed.get("style") or "Trendy"
         body_shape = body_shape or parsed.get("body_shape") or "Hourglass"
         season = season or parsed.get("season")
         occasion = occasion or parsed.get("occasion")
         features = features or parsed.get("features")
+        start = metrics.observe("parse", start)
+
+    allowed = None
+    if feature_mode == "filter" and features:
+        if index is None:
+            index = AttributeIndex(engine.outfits)
+        allowed = index.mask(index.query(features=features))
+        rows = rows[allowed[rows]]
+        start = metrics.observe("filter", start)
+
+    if tables is not None and gender is not None:
+        bucket = tables.bucket(style, body_shape, gender)
+        if bucket is not None:
+            bucket_rows = bucket.rows
+            bucket_lists = (bucket.style_scores, bucket.bodyshape_scores, bucket.base_scores)
+            if allowed is not None:
+                keep = [i for i, row in enumerate(bucket_rows) if allowed[row]]
+                bucket_rows = [bucket_rows[i] for i in keep]
+                bucket_lists = [[values[i] for i in keep] for values in bucket_lists]
+                start = metrics.observe("filter", start)
+            bound = _context_bound(engine, season, occasion, features)
+            selected = _select_topk(
+                engine, bucket_rows, bucket_rows, *bucket_lists, shortlist, season, occasion, features, bound,
+                exhaustive=bucket.complete,
+            )
+            start = metrics.observe("select", start)
+            if selected is not None:
+                metrics.observe_candidates(len(bucket_rows))
+                results = _results(engine, selected, style, body_shape, season, occasion, features)
+                if diversity > 0:
+                    results = diversify(results, topk, diversity)
+                    metrics.observe("diversify", start)
+                return results
+
+    metrics.observe_candidates(len(rows))
+
+    # --- Steps 1 & 2: Style and Body Shape, vectorized over all candidates ---
+    style_scores = engine.style_scores(style, rows)
+    bs_scores = engine.bodyshape_scores(body_shape, rows)
+
+    # If style match is too low, skip outfit early (hard rule)
+    keep = np.flatnonzero(style_scores >= 0.3)
+    rows, style_scores, bs_scores = rows[keep], style_scores[keep], bs_scores[keep]
+
+    # Moderate penalty if body shape score is very low but don't exclude outright
+    bs_scores = np.where(bs_scores < 0.2, bs_scores * 0.5, bs_scores)  # Penalize but keep for diversity
+    base_scores = style_scores * 3.0 + bs_scores * 2.0
+    start = metrics.observe("score", start)
+
+    # Input order breaks ties, as a stable sort over `rows` would
+    positions = keep
+    bound = None
+    if prune:
+        # Visit candidates best base score first so the scan can stop early
+        order = np.lexsort((positions, -base_scores))
+        rows, style_scores, bs_scores, base_scores, positions = (
+            rows[order], style_scores[order], bs_scores[order], base_scores[order], positions[order]
+        )
+        bound = _context_bound(engine, season, occasion, features)
+        start = metrics.observe("sort", start)
+
+    selected = _select_topk(
+        engine, rows.tolist(), positions.tolist(), style_scores.tolist(), bs_scores.tolist(),
+        base_scores.tolist(), shortlist, season, occasion, features, bound,
+    )
+    start = metrics.observe("select", start)
+    results = _results(engine, selected, style, body_shape, season, occasion, features)
+    if diversity > 0:
+        results = diversify(results, topk, diversity)
+        metrics.observe("diversify", start)
+    return results
+
+
+def recommend_request(engine, tables, index, request, default_style="Casual", parsed=None):
+    """
+    Serves one API request: a dict with 'gender', 'body_shape' and 'prompt' (plus
+    optional 'topk', 'feature_mode' and 'diversity'), over the gender's rows and the
+    precomputed tables. The style defaults to `default_style` when the prompt names
+    none. `parsed` is the prompt's parse, if the caller has already parsed it.
+    """
+    start = metrics.clock()
+    if parsed is None:
+        parsed = parse_prompt_cached(request['prompt'])
+    start = metrics.observe("parse", start)
+    rows = index.rows(gender=request['gender'])
+    metrics.observe("filter", start)
+    return recommend_best_combined(
+        engine.outfits,
+        request['prompt'],
+        None,
+        None,
+        topk=request.get('topk', 3),
+        style=parsed['style'] or default_style,
+        body_shape=request['body_shape'],
+        features=parsed['features'],
+        engine=engine,
+        rows=rows,
+        tables=tables,
+        gender=request['gender'],
+        index=index,
+        feature_mode=request.get('feature_mode', "boost"),
+        diversity=request.get('diversity', 0.0),
+        parsed=parsed,
+    )
+
+
+def recommend_batch(
+    requests,
+    engine,
+    index=None,
+    default_style="Casual",
+    topk=3,
+    feature_mode="boost",
+    diversity=0.0,
+    parsed=None,
+):
+    """
+    Recommends for many profiles in one pass over the catalog.
+
+    `requests` is a sequence of dicts with 'gender', 'body_shape' and 'prompt' (plus
+    optional 'topk', 'feature_mode' and 'diversity'). Each distinct prompt is parsed
+    once, base scores are computed and ranked once per (style, body shape) group, and
+    identical queries are answered once. Returns one result list per request, in order, each
+    the same as recommend_best_combined would return for it. `parsed` optionally maps
+    prompts to their parse results already computed by the caller.
+    """
+    if index is None:
+        index = AttributeIndex(engine.outfits)
+    start = metrics.clock()
+    known = parsed or {}
+    parsed = {p: known[p] if p in known else parse_prompt_cached(p) for p in {r['prompt'] for r in requests}}
+    start = metrics.observe("parse", start)
 
-    scored = []
-    for outfit in outfits:
-        # --- Step 1: Style Matching ---
-        style_scores, _ = score_outfit(outfit, [style], style_score_map, attr_weights)
-        style_score = list(style_scores.values())[0] if style_scores else 0
-
-        # If style match is too low, skip outfit early (hard rule)
-        if style_score < 0.3:
-            continue  # Outfit style mismatch too strong
-
-        # --- Step 2: Body Shape Compatibility ---
-        bs_scores, _ = score_outfit(outfit, [body_shape], bodyshape_score_map, attr_weights)
-        bs_score = list(bs_scores.values())[0] if bs_scores else 0
-
-        # Moderate penalty if body shape score is very low but don't exclude outright
-        if bs_score < 0.2:
-            bs_score *= 0.5  # Penalize but keep for diversity
-
-        # --- Step 3: Season Suitability ---
-        season_score = heuristic_season_score(outfit, season) if season else 0
-        # Reward matching season moderately, penalize mismatch slightly
-        if season_score < 0.1:
-            season_score -= 0.1  # small penalty for season mismatch
-
-        # --- Step 4: Occasion Relevance ---
-        occasion_score = heuristic_occasion_score(outfit, occasion) if occasion else 0
-        # Occasion is very important, scale by 1.5
-        occasion_score *= 1.5
-
-        # --- Step 5: Feature Precision ---
-        feature_bonus = 0
-        if features:
-            # Calculate how many features matched
-            total_features = len(features)
-            matched_features = 0
-            for key, val in features.items():
-                val = val.lower()
-                # Some features may be list, convert all to string lower for search
-                outfit_vals = [str(v).lower() for v in outfit.values()]
-                if any(val in ov for ov in outfit_vals):
-                    matched_features += 1
-            # Feature bonus proportional to matched ratio, scaled small
-            feature_bonus = (matched_features / total_features) * 0.2
-
-        # --- Step 6: Combine all scores with weights reflecting importance ---
-        combined_score = (
-            (style_score * 3.0) +       # style is most important
-            (bs_score * 2.0) +          # body shape next
-            (occasion_score * 2.5) +    # occasion very important
-            (season_score * 1.5) +      # season moderate importance
-            feature_bonus               # feature bonus small
+    # Distinct queries, each with the largest topk asked for it
+    queries = {}
+    keys = []
+    for r in requests:
+        intent = parsed[r['prompt']]
+        features = intent['features']
+        key = (
+            intent['style'] or default_style, r['body_shape'], r['gender'], intent['season'],
+            intent['occasion'], tuple(sorted(features.items())), r.get('feature_mode', feature_mode),
+            r.get('diversity', diversity),
         )
+        keys.append(key)
+        queries[key] = max(queries.get(key, 0), r.get('topk', topk))
 
-        scored.append({
-            'outfit': outfit,
-            'score': combined_score,
-            'style_score': style_score,
-            'bodyshape_score': bs_score,
-            'season_score': season_score,
-            'occasion_score': occasion_score,
-            'feature_bonus': feature_bonus,
-            'style': style,
-            'body_shape': body_shape,
-            'occasion': occasion,
-            'season': season,
-            'features': features
-        })
+    style_scores = {}
+    bs_scores = {}
+    answers = {}
+    groups = {}
+    for key in queries:
+        groups.setdefault(key[:2], []).append(key)
+    for (style, body_shape), group in groups.items():
+        # --- Steps 1 & 2 once per group: score, threshold and rank the whole catalog ---
+        if style not in style_scores:
+            style_scores[style] = engine.style_scores(style)
+        if body_shape not in bs_scores:
+            scores = engine.bodyshape_scores(body_shape)
+            bs_scores[body_shape] = np.where(scores < 0.2, scores * 0.5, scores)
+        eligible = np.flatnonzero(style_scores[style] >= 0.3)
+        s = style_scores[style][eligible]
+        b = bs_scores[body_shape][eligible]
+        base = s * 3.0 + b * 2.0
+        order = np.lexsort((eligible, -base))
+        ranked_rows, s, b, base = eligible[order], s[order], b[order], base[order]
+        start = metrics.observe("score", start)
 
+        for key in group:
+            _, _, gender, season, occasion, feature_items, mode, key_diversity = key
+            features = dict(feature_items)
+            bits = index.gender_bitset(gender)
+            if mode == "filter" and features:
+                bits = bits & index.query(features=features)
+            keep = index.mask(bits)[ranked_rows]
+            rows = ranked_rows[keep]
+            metrics.observe_candidates(len(rows))
+            start = metrics.observe("filter", start)
+            bound = _context_bound(engine, season, occasion, features)
+            # Diversified answers re-rank one shortlist, so smaller topks are prefixes too
+            shortlist = shortlist_size(queries[key]) if key_diversity > 0 else queries[key]
+            selected = _select_topk(
+                engine, rows.tolist(), rows.tolist(), s[keep].tolist(), b[keep].tolist(),
+                base[keep].tolist(), shortlist, season, occasion, features, bound,
+            )
+            answers[key] = _results(engine, selected, style, body_shape, season, occasion, features)
+            start = metrics.observe("select", start)
+            if key_diversity > 0:
+                answers[key] = diversify(answers[key], queries[key], key_diversity)
+                start = metrics.observe("diversify", start)
+
+    return [answers[key][:r.get('topk', topk)] for key, r in zip(keys, requests)]
+
+
+def _select_topk(engine, rows, positions, style_scores, bs_scores, base_scores, topk,
+                 season, occasion, features, bound=None, exhaustive=True):
+    """
+    Bounded-heap top-k over candidates that already passed the style threshold.
+
+    Only the heap entries are kept, so nothing is allocated for outfits that never
+    make the top-k. With a `bound` (upper limit on what season, occasion and features
+    can add), candidates must come in descending base-score order and the scan stops
+    as soon as none of the rest can enter the top-k. Returns None when the candidates
+    run out before that point and they are not `exhaustive`.
+    """
+    if topk <= 0:
+        return []
+    # Season and occasion points for the whole catalog, compiled once per name
+    season_scores = engine.season_scores(season)
+    occasion_scores = engine.occasion_scores(occasion)
+    # Matched prompt features of every candidate, in one pass over cached masks
+    matches = engine.feature_matches(features, rows).tolist() if features else None
+    heap = []
+    certain = exhaustive
+    for i, row in enumerate(rows):
+        if bound is not None and len(heap) == topk and base_scores[i] + bound + 1e-9 < heap[0][0]:
+            certain = True
+            break
+        style_score = style_scores[i]
+        bs_score = bs_scores[i]
+        season_score, occasion_score, feature_bonus = _context_scores(
+            0 if season_scores is None else float(season_scores[row]),
+            0 if occasion_scores is None else float(occasion_scores[row]),
+            matches[i] if features else 0,
+            len(features) if features else 0,
+        )
+        combined_score = _combine(style_score, bs_score, occasion_score, season_score, feature_bonus)
+        # Lowest score, then latest position, sits at the top of the heap
+        entry = (combined_score, -positions[i], row, style_score, bs_score,
+                 season_score, occasion_score, feature_bonus)
+        if len(heap) < topk:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+    if not certain:
+        return None
     # Sort descending by combined score
-    scored.sort(key=lambda x: x['score'], reverse=True)
-    return scored[:topk]
+    heap.sort(reverse=True)
+    return heap
+
+
+def _results(engine, selected, style, body_shape, season, occasion, features):
+    return [
+        _result(
+            engine.outfits[row], score, style_score, bs_score, season_score, occasion_score,
+            feature_bonus, style, body_shape, occasion, season, features,
+        )
+        for score, _, row, style_score, bs_score, season_score, occasion_score, feature_bonus in selected
+    ]
+
+
+def _context_scores(season_score, occasion_score, matched_features, total_features):
+    """Season, occasion and feature parts of the score for one outfit, from its raw season and occasion points."""
+    # --- Step 3: Season Suitability ---
+    # Reward matching season moderately, penalize mismatch slightly
+    if season_score < 0.1:
+        season_score -= 0.1  # small penalty for season mismatch
+
+    # --- Step 4: Occasion Relevance ---
+    # Occasion is very important, scale by 1.5
+    occasion_score *= 1.5
+
+    # --- Step 5: Feature Precision ---
+    feature_bonus = 0
+    if total_features:
+        # Feature bonus proportional to matched ratio, scaled small
+        feature_bonus = (matched_features / total_features) * 0.2
+
+    return season_score, occasion_score, feature_bonus
+
+
+def _combine(style_score, bs_score, occasion_score, season_score, feature_bonus):
+    # --- Step 6: Combine all scores with weights reflecting importance ---
+    return (
+        (style_score * 3.0) +       # style is most important
+        (bs_score * 2.0) +          # body shape next
+        (occasion_score * 2.5) +    # occasion very important
+        (season_score * 1.5) +      # season moderate importance
+        feature_bonus               # feature bonus small
+    )
+
+
+def _result(outfit, score, style_score, bs_score, season_score, occasion_score, feature_bonus,
+            style, body_shape, occasion, season, features):
+    return {
+        'outfit': outfit,
+        'score': score,
+        'style_score': style_score,
+        'bodyshape_score': bs_score,
+        'season_score': season_score,
+        'occasion_score': occasion_score,
+        'feature_bonus': feature_bonus,
+        'style': style,
+        'body_shape': body_shape,
+        'occasion': occasion,
+        'season': season,
+        'features': features
+    }
+
+
+def _context_bound(engine, season, occasion, features):
+    """Upper bound on what season, occasion and features can add to a base score."""
+    season_max = engine.season_bound(season)
+    if season_max < 0.1:
+        season_max -= 0.1
+    occasion_max = engine.occasion_bound(occasion) * 1.5
+    return occasion_max * 2.5 + season_max * 1.5 + (0.2 if features else 0)
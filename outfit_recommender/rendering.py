@@ -0,0 +1,52 @@
+"""
+Pre-rendered JSON for recommendation responses.
+
+Responses are assembled from JSON text instead of building an OutfitResponse model
+per outfit for FastAPI to validate and encode again. The `"attribute":"value"`
+fragment of every attribute code is rendered once, at import, so an outfit's
+attributes object is a join of ready-made pieces, and strings go through the C
+string encoder json.dumps uses. The output is byte-for-byte what FastAPI returns
+for the response models in main.py; `python -m benchmarks.contract` checks that.
+"""
+from json.encoder import encode_basestring as _string
+
+from .attribute_mapping import ATTRIBUTE_CODE_MAPS
+from .catalog import ATTRIBUTE_NAMES
+
+# Attribute column -> code -> '"attribute":"value"'
+_ATTRIBUTE_FRAGMENTS = [
+    [f"{_string(attr)}:{_string(ATTRIBUTE_CODE_MAPS[attr][str(code)])}" for code in range(len(ATTRIBUTE_CODE_MAPS[attr]))]
+    for attr in ATTRIBUTE_NAMES
+]
+
+
+def outfit_json(result: dict) -> str:
+    """One recommendation (a recommend_* result dict) as an OutfitResponse object."""
+    outfit = result['outfit']
+    attributes = ",".join([fragments[code] for fragments, code in zip(_ATTRIBUTE_FRAGMENTS, outfit.codes)])
+    # Scores are truncated to the declared int fields, as OutfitResponse needs
+    return (
+        f'{{"gender":{_string(outfit.gender)},"image_label":{_string(outfit.image_label)},'
+        f'"image_url":{_string(outfit.image_url)},"attributes":{{{attributes}}},'
+        f'"total_score":{int(result["score"])},"style_score":{int(result["style_score"])},'
+        f'"bodyshape_score":{int(result["bodyshape_score"])}}}'
+    )
+
+
+def recommendations_json(results: list) -> str:
+    """A RecommendationResponse."""
+    return f'{{"recommendations":[{",".join([outfit_json(result) for result in results])}]}}'
+
+
+def batch_json(result_lists: list) -> str:
+    """A BatchRecommendationResponse, one RecommendationResponse per result list."""
+    return f'{{"results":[{",".join([recommendations_json(results) for results in result_lists])}]}}'
+
+
+def page_json(results: list, total: int, next_cursor: str = None) -> str:
+    """A RecommendationPage."""
+    cursor = "null" if next_cursor is None else _string(next_cursor)
+    return (
+        f'{{"recommendations":[{",".join([outfit_json(result) for result in results])}],'
+        f'"total":{total},"next_cursor":{cursor}}}'
+    )
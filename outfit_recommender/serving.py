@@ -0,0 +1,186 @@
+"""
+Serving state: everything a request reads, built and published as one unit.
+
+A ServingState holds one load of the data (score maps, catalog) together with
+everything derived from it (engine, index, precomputed tables, similarity index,
+compiled weight profiles, scoring pool). A
+reload builds a complete new state off to the side and publishes it by swapping a
+single reference; requests take that reference once and use it throughout, so they
+never see a mix of two loads. Requests hold the state between acquire() and
+release(), and a replaced state is retire()d: its scoring pool is shut down once the
+last request holding it is done.
+"""
+import asyncio
+import threading
+
+from .engine import ScoreEngine
+from .index import AttributeIndex
+from .precompute import ScoreTables
+from .profiles import DEFAULT_PROFILE, WeightProfile, profile_name, recommend_batch_by_profile
+from .similarity import SimilarityIndex
+from .recommender import recommend_request
+
+
+class _PoolUsers:
+    # Requests holding a scoring pool; states that share the pool (profile changes)
+    # share one count, so the pool outlives every request using any of them
+    __slots__ = ('pool', 'count', 'retired', 'lock')
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.count = 0
+        self.retired = False
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            self.count += 1
+
+    def release(self):
+        with self.lock:
+            self.count -= 1
+            idle = self.retired and self.count == 0
+        if idle:
+            self._shutdown()
+
+    def retire(self):
+        with self.lock:
+            self.retired = True
+            idle = self.count == 0
+        if idle:
+            self._shutdown()
+
+    def _shutdown(self):
+        # Nothing is submitted to a retired pool once its last user is gone
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+class ServingState:
+    """
+    One immutable generation of the served data. `version` identifies it, e.g. in
+    cache keys. `pool` is an optional started ScoringPool/ShardedScoringPool for the
+    same catalog; without one, requests are scored in a thread of this process.
+    `profiles` maps weight profile names to their weights (see profiles.py); each
+    is compiled with the state, and DEFAULT_PROFILE scores with `attr_weights`.
+    """
+    __slots__ = (
+        'version', 'style_score_map', 'bodyshape_score_map', 'outfits',
+        'engine', 'index', 'tables', 'similar', 'profiles', 'pool', 'users',
+    )
+
+    def __init__(self, version, style_score_map, bodyshape_score_map, outfits, attr_weights=None, pool=None,
+                 profiles=None):
+        self.version = version
+        self.style_score_map = style_score_map
+        self.bodyshape_score_map = bodyshape_score_map
+        self.outfits = outfits
+        # Encode the catalog and compile the score maps once, then rank every
+        # (style, body shape, gender) bucket up front
+        self.engine = ScoreEngine(outfits, style_score_map, bodyshape_score_map, attr_weights)
+        self.index = AttributeIndex(outfits)
+        self.tables = ScoreTables(self.engine)
+        self.similar = SimilarityIndex(self.engine.outfits)
+        self.profiles = {DEFAULT_PROFILE: WeightProfile(DEFAULT_PROFILE, dict(attr_weights or {}), self.engine, self.tables)}
+        for name, weights in (profiles or {}).items():
+            self.profiles[name] = WeightProfile.compile(
+                name, weights, self.engine, style_score_map, bodyshape_score_map
+            )
+        self.pool = pool
+        self.users = _PoolUsers(pool)
+
+    def updated(self, version, outfits, delta, pool=None) -> "ServingState":
+        """
+        State for `outfits`, this state's catalog with a CatalogDelta applied and the
+        same score maps. Compiled score tables are reused and only the rows the delta
+        touches are rescored in the precomputed tables.
+        """
+        state = object.__new__(ServingState)
+        state.version = version
+        state.style_score_map = self.style_score_map
+        state.bodyshape_score_map = self.bodyshape_score_map
+        state.outfits = outfits
+        state.engine = self.engine.with_catalog(outfits)
+        state.index = AttributeIndex(outfits)
+        state.tables = self.tables.updated(state.engine, delta)
+        state.similar = SimilarityIndex(state.engine.outfits)
+        state.profiles = {
+            name: WeightProfile(name, profile.weights, state.engine, state.tables) if name == DEFAULT_PROFILE
+            else profile.updated(outfits, delta)
+            for name, profile in self.profiles.items()
+        }
+        state.pool = pool
+        state.users = _PoolUsers(pool)
+        return state
+
+    def with_profile(self, name, weights) -> "ServingState":
+        """
+        This state with weight profile `name` compiled from `weights` (added, or
+        replacing the profile of that name). Everything else is shared, pool included.
+        """
+        profile = WeightProfile.compile(name, weights, self.engine, self.style_score_map, self.bodyshape_score_map)
+        return self._with_profiles({**self.profiles, name: profile})
+
+    def without_profile(self, name) -> "ServingState":
+        """This state without weight profile `name`; everything else is shared."""
+        return self._with_profiles({key: profile for key, profile in self.profiles.items() if key != name})
+
+    def _with_profiles(self, profiles):
+        state = object.__new__(ServingState)
+        for slot in ServingState.__slots__:
+            setattr(state, slot, getattr(self, slot))
+        state.profiles = profiles
+        return state
+
+    def profile(self, name) -> WeightProfile:
+        """The compiled weight profile `name`; KeyError if there is none."""
+        return self.profiles[name]
+
+    def _pool_profiles(self, requests):
+        # Weights of the non-default profiles the requests use, for workers to compile or look up
+        names = {profile_name(request) for request in requests} - {DEFAULT_PROFILE}
+        return {name: self.profiles[name].weights for name in names}
+
+    async def recommend(self, request: dict, default_style: str = "Casual", parsed=None) -> list:
+        """
+        recommend_request for one request dict, off the event loop, under its weight
+        profile. `parsed` is the prompt's parse if the caller has it; it is shipped
+        to the scoring worker so the prompt is not parsed there again.
+        """
+        profile = self.profiles[profile_name(request)]
+        if self.pool is not None:
+            return await self.pool.recommend(request, default_style, self._pool_profiles([request]), parsed)
+        return await asyncio.to_thread(
+            recommend_request, profile.engine, profile.tables, self.index, request, default_style, parsed
+        )
+
+    async def recommend_batch(self, requests: list, default_style: str = "Casual", parsed=None) -> list:
+        """
+        recommend_batch for a list of request dicts, off the event loop, each under
+        its weight profile. `parsed` optionally maps prompts to their parses.
+        """
+        if self.pool is not None:
+            return await self.pool.recommend_batch(requests, default_style, self._pool_profiles(requests), parsed)
+        return await asyncio.to_thread(
+            recommend_batch_by_profile, requests, lambda name: self.profiles[name].engine, self.index, default_style,
+            parsed,
+        )
+
+    def acquire(self):
+        """Marks a request as using this state until the matching release()."""
+        self.users.acquire()
+
+    def release(self):
+        self.users.release()
+
+    def retire(self):
+        """
+        Called when the state has been replaced: its pool is shut down as soon as no
+        request holds the state (or another state sharing the pool) any more.
+        """
+        self.users.retire()
+
+    def close(self, wait: bool = False):
+        """Shuts the pool down; with `wait`, lets work already submitted finish first."""
+        if self.pool is not None:
+            self.pool.shutdown(wait)
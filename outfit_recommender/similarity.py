@@ -0,0 +1,120 @@
+"""
+"More like this" index over outfit attribute codes.
+
+Two outfits are as similar as the number of attributes on which their codes agree
+(the dot product of their one-hot encodings). An exact k-NN query is a scan of the
+whole code matrix, so large catalogs are indexed with bit-sampling LSH: each of
+LSH_TABLES tables buckets every outfit on its codes for LSH_BAND fixed attributes,
+so outfits that agree on most attributes share a bucket in some table with high
+probability. A query gathers its own buckets (at most MAX_BUCKET rows from each) and
+re-ranks those candidates exactly. Catalogs of up to EXACT_ROWS outfits are scanned.
+
+The index is built with the rest of a ServingState, so it always matches the
+catalog being served.
+"""
+import numpy as np
+
+from .catalog import Catalog, ATTRIBUTE_NAMES, ATTRIBUTE_SIZES
+from .snapshot import unpack_strings
+
+LSH_TABLES = 8
+LSH_BAND = 6
+MAX_BUCKET = 2048
+EXACT_ROWS = 10_000
+
+# Matching attributes are counted with a BLAS matrix-vector product
+_ONES = np.ones(len(ATTRIBUTE_NAMES), dtype=np.float32)
+
+
+class SimilarityIndex:
+    """Approximate k-nearest-neighbour search over a Catalog's attribute codes."""
+
+    def __init__(self, catalog: Catalog, tables: int = LSH_TABLES, band: int = LSH_BAND, seed: int = 0):
+        self.catalog = catalog
+        self.codes = catalog.codes
+        # Rows ordered by a hash of their label, to find the queried outfit
+        label_hashes = np.array([hash(label) for label in _labels(catalog)], dtype=np.int64)
+        self._label_order = np.argsort(label_hashes, kind="stable")
+        self._label_hashes = label_hashes[self._label_order]
+        # All tables share flat arrays, so a query looks its buckets up in one step:
+        # bucket keys of table t are offset by t * key space and stay sorted across
+        # tables, `_rows` lists every table's rows grouped by bucket and `_starts`
+        # holds each bucket's first position in it (plus the end)
+        self._tables = 0
+        if len(catalog) > EXACT_ROWS:
+            rng = np.random.default_rng(seed)
+            self._cols = np.array([
+                np.sort(rng.choice(len(ATTRIBUTE_NAMES), size=band, replace=False)) for _ in range(tables)
+            ])
+            # Mixed-radix key over each band's codes, unique per code combination
+            sizes = ATTRIBUTE_SIZES[self._cols]
+            self._multipliers = np.cumprod(np.hstack((np.ones((tables, 1), dtype=np.int64), sizes[:, :-1])), axis=1)
+            self._offsets = np.arange(tables, dtype=np.int64) * int(sizes.prod(axis=1).max())
+            rows, keys, starts = [], [], []
+            for t in range(tables):
+                table_keys = self.codes[:, self._cols[t]].astype(np.int64) @ self._multipliers[t] + self._offsets[t]
+                # Stable, so every bucket lists its rows in catalog order
+                order = np.argsort(table_keys, kind="stable")
+                distinct, first = np.unique(table_keys[order], return_index=True)
+                rows.append(order.astype(np.int32))
+                keys.append(distinct)
+                starts.append(first + t * len(catalog))
+            self._rows = np.concatenate(rows)
+            self._keys = np.concatenate(keys)
+            self._starts = np.append(np.concatenate(starts), len(self._rows))
+            self._tables = tables
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def find(self, image_label: str):
+        """Row of the first outfit with this image label, or None."""
+        target = hash(image_label)
+        i = int(np.searchsorted(self._label_hashes, target))
+        while i < len(self._label_hashes) and self._label_hashes[i] == target:
+            row = int(self._label_order[i])
+            if self.catalog.label(row) == image_label:
+                return row
+            i += 1
+        return None
+
+    def candidates(self, row: int) -> np.ndarray:
+        """Rows sharing a bucket with `row` in any table (every row when scanning), `row` excluded."""
+        if not self._tables:
+            rows = np.arange(len(self))
+            return rows[rows != row]
+        keys = (self.codes[row][self._cols].astype(np.int64) * self._multipliers).sum(axis=1) + self._offsets
+        # The row's own buckets always exist
+        buckets = np.searchsorted(self._keys, keys)
+        starts = self._starts[buckets]
+        stops = np.minimum(self._starts[buckets + 1], starts + MAX_BUCKET)
+        rows = np.concatenate([self._rows[a:b] for a, b in zip(starts.tolist(), stops.tolist())])
+        # Sort and drop repeats; much cheaper than np.unique on a few thousand rows
+        rows = np.sort(rows).astype(np.intp)
+        keep = np.empty(len(rows), dtype=bool)
+        keep[0] = True
+        np.not_equal(rows[1:], rows[:-1], out=keep[1:])
+        keep &= rows != row
+        return rows[keep]
+
+    def similar(self, row: int, topk: int = 10) -> list:
+        """
+        Up to `topk` (row, matching attributes) pairs most similar to `row`, most
+        matching attributes first, ties in catalog order.
+        """
+        rows = self.candidates(row)
+        # np.take gathers rows far faster than fancy indexing
+        same = np.take(self.codes, rows, axis=0) == self.codes[row]
+        matches = (same.astype(np.float32) @ _ONES).astype(np.intp)
+        if len(rows) > topk:
+            # Keep every row tied with the k-th best, then order those exactly
+            kth = np.partition(matches, len(rows) - topk)[len(rows) - topk]
+            keep = matches >= kth
+            rows, matches = rows[keep], matches[keep]
+        best = np.lexsort((rows, -matches))[:topk]
+        return list(zip(rows[best].tolist(), matches[best].tolist()))
+
+
+def _labels(catalog: Catalog) -> list:
+    arrays = catalog.arrays()
+    return unpack_strings(arrays['label_blob'], arrays['label_offsets'])
@@ -0,0 +1,139 @@
+"""
+Single-file binary snapshots of named NumPy arrays plus a JSON metadata header.
+
+Layout: 8-byte magic, 8-byte little-endian header length, UTF-8 JSON header, then
+each array's raw bytes aligned to 64 bytes. Reading memory-maps the file, so every
+array is a zero-copy view backed by the OS page cache.
+"""
+import json
+import os
+import struct
+import tempfile
+from array import array
+
+import numpy as np
+
+MAGIC = b"OUTSNAP1"
+_ALIGN = 64
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_snapshot(path: str, arrays: dict, meta: dict = None):
+    """Atomically writes `arrays` (name -> ndarray) and `meta` to `path`."""
+    arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        offset = _aligned(offset)
+        layout[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += arr.nbytes
+    header = json.dumps({"meta": meta or {}, "arrays": layout}).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for name, arr in arrays.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(arr.tobytes())
+            f.truncate(data_start + offset)
+        # Readers see either the old or the new file, never a partial one
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def read_snapshot(path: str) -> tuple:
+    """Memory-maps a snapshot. Returns (arrays, meta); arrays are read-only views."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an outfit snapshot")
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = _aligned(len(MAGIC) + 8 + header_len)
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        start = data_start + spec["offset"]
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[name] = buf[start:start + count * dtype.itemsize].view(dtype).reshape(shape)
+    return arrays, header["meta"]
+
+
+def pack_strings(values: list) -> tuple:
+    """Packs strings into a UTF-8 blob plus (n + 1) byte offsets."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class StringPacker:
+    """pack_strings for strings arriving in batches; each batch is packed as it comes."""
+
+    def __init__(self):
+        self._blob = bytearray()
+        self._offsets = array('q', [0])
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def extend(self, values):
+        blob, offsets = self._blob, self._offsets
+        for value in values:
+            blob += value.encode("utf-8")
+            offsets.append(len(blob))
+
+    def packed(self) -> tuple:
+        """(blob, offsets) as pack_strings returns them, sharing this packer's buffers."""
+        return np.frombuffer(self._blob, dtype=np.uint8), np.frombuffer(self._offsets, dtype=np.int64)
+
+
+def unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> list:
+    """Inverse of pack_strings."""
+    raw = blob.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+
+def edit_strings(blob: np.ndarray, offsets: np.ndarray, keep: np.ndarray = None,
+                 replace: dict = None, append: list = ()) -> tuple:
+    """
+    Edits a packed string table without unpacking it: replaces the strings at the
+    rows in `replace` (row -> str), drops rows where `keep` is False, then appends
+    `append`. Returns the new (blob, offsets).
+    """
+    if replace:
+        pieces = []
+        lengths = np.diff(offsets)
+        start = 0
+        for row in sorted(replace):
+            pieces.append(blob[offsets[start]:offsets[row]])
+            encoded = replace[row].encode("utf-8")
+            pieces.append(np.frombuffer(encoded, dtype=np.uint8))
+            lengths[row] = len(encoded)
+            start = row + 1
+        pieces.append(blob[offsets[start]:offsets[-1]])
+        blob = np.concatenate(pieces)
+        offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    if keep is not None:
+        lengths = np.diff(offsets)
+        blob = blob[np.repeat(keep, lengths)]
+        offsets = np.concatenate(([0], np.cumsum(lengths[keep]))).astype(np.int64)
+    if append:
+        extra_blob, extra_offsets = pack_strings(list(append))
+        blob = np.concatenate((blob, extra_blob))
+        offsets = np.concatenate((offsets, extra_offsets[1:] + offsets[-1]))
+    return blob, offsets
@@ -1,98 +1,150 @@
+"""
+Season and occasion heuristics, expressed as data.
+
+Each rule group lists the seasons (or occasions) it applies to and, per attribute,
+the points an outfit earns for each attribute value. A RuleTable compiles the groups
+into dense lookup rows over attribute codes (the same layout as the compiled style
+and body shape tables), so one gather-and-sum scores the whole catalog. New seasons
+or occasions are new rule groups; no scoring code changes.
+"""
 from typing import Dict, Any, Optional
 
-def heuristic_season_score(outfit: Dict[str, Any], season: Optional[str]) -> float:
+import numpy as np
+
+from .catalog import ATTRIBUTE_NAMES, ATTRIBUTE_OFFSETS, TABLE_WIDTH, VALUE_CODES, NA_CODES
+
+SEASON_RULES = [
+    # Summer: prefer light fabrics (cotton, chiffon), floral or pure colors, short sleeves, less outerwear
+    (["summer", "hot"], {
+        "fabric_upper": {"cotton": 2.0, "chiffon": 2.0},
+        "fabric_lower": {"cotton": 1.0, "chiffon": 1.0},
+        "pattern_upper": {"Floral": 1.5, "Pure Color": 1.5},
+        "pattern_lower": {"Floral": 0.5, "Pure Color": 0.5},
+        "sleeve_length": {"Sleeveless": 2.0, "Short Sleeve": 2.0},
+        "outer": {"No": 1.0},
+        "covers_navel": {"Yes": 0.5},
+    }),
+    # Winter: prefer warm fabrics (furry, knitted, leather), dark colors, long sleeves, outerwear like cardigan
+    (["winter", "cold"], {
+        "fabric_upper": {"leather": 2.5, "furry": 2.5, "knitted": 2.5},
+        "fabric_outer": {"leather": 1.5, "furry": 1.5, "knitted": 1.5},
+        "sleeve_length": {"Long Sleeve": 2.0},
+        "outer": {"Cardigan": 2.0},
+        "pattern_upper": {"Pure Color": 1.0},  # often darker
+    }),
+    # Spring: prefer light fabrics, medium sleeves, floral patterns, some layering allowed
+    (["spring"], {
+        "fabric_upper": {"cotton": 1.5, "chiffon": 1.5},
+        "pattern_upper": {"Floral": 2.0},
+        "sleeve_length": {"Medium Sleeve": 1.5},
+        "outer": {"Cardigan": 1.0, "No": 1.0},
+    }),
+    # Fall / Autumn: warmer fabrics but lighter than winter, layering with cardigan, warm colors
+    (["fall", "autumn"], {
+        "fabric_upper": {"cotton": 2.0, "leather": 2.0, "knitted": 2.0},
+        "outer": {"Cardigan": 2.0},
+        "sleeve_length": {"Medium Sleeve": 1.5, "Long Sleeve": 1.5},
+        "pattern_upper": {"Lattice": 1.0, "Color Block": 1.0},  # warm tones
+    }),
+    # Rainy: prefer water-resistant fabrics (leather), no outerwear to get wet
+    (["rainy"], {
+        "fabric_upper": {"leather": 2.0},
+        "outer": {"No": 1.0},
+    }),
+    (["dry"], {
+        "fabric_upper": {"cotton": 1.5, "chiffon": 1.5},
+        "outer": {"No": 1.0},
+    }),
+]
+
+OCCASION_RULES = [
+    # Formal occasions: wedding, party, ceremony, interview, work, business, meeting
+    (["wedding", "party", "ceremony", "interview", "work", "office", "business", "meeting", "graduation"], {
+        "outer": {"Cardigan": 2.0},  # cardigan or similar outerwear is good for formal
+        "sleeve_length": {"Long Sleeve": 1.5},
+        "neckwear": {"Yes": 1.0},
+        "waist_acc": {"Belt": 1.0, "Clothing": 1.0},
+        "fabric_upper": {"leather": 1.0, "cotton": 1.0},  # considered formal
+        "glasses": {"Eyeglasses": 0.5, "Sunglasses": 0.5},
+    }),
+    # Casual occasions: casual, holiday, vacation, picnic, date
+    (["casual", "holiday", "vacation", "picnic", "date"], {
+        "sleeve_length": {"Sleeveless": 1.5, "Short Sleeve": 1.5, "Medium Sleeve": 1.5},
+        "outer": {"No": 1.0},
+        "hat": {"Yes": 0.5},
+        "socks": {"No": 0.5},
+    }),
+    # Sport or gym occasions
+    (["sport", "gym"], {
+        "socks": {"Socks": 2.0},
+        "sleeve_length": {"Sleeveless": 1.5, "Short Sleeve": 1.5},
+        "fabric_upper": {"cotton": 1.0, "other": 1.0},  # flexible fabrics
+        "waist_acc": {"Belt": 0.5},
+    }),
+]
+
+_COLUMNS = {attr: col for col, attr in enumerate(ATTRIBUTE_NAMES)}
+
+
+class RuleTable:
     """
-    Assign heuristic scores to outfits based on the season.
-    Args:
-        outfit: dict of outfit attributes, keys are attribute names and values are codes or values
-        season: target season string (e.g., 'summer', 'winter', 'spring', 'fall')
-    Returns:
-        float score based on matching season heuristics
+    Rule groups compiled into a dense (groups x TABLE_WIDTH) table of points per
+    attribute code. Names are matched case-insensitively; a name listed in several
+    groups uses the first.
     """
-    if not season:
-        return 0.0
 
-    season = season.lower()
-    score = 0.0
+    def __init__(self, rules: list):
+        self.groups = {}
+        self.table = np.zeros((len(rules), TABLE_WIDTH), dtype=np.float64)
+        for i, (names, weights) in enumerate(rules):
+            for name in names:
+                self.groups.setdefault(name.lower(), i)
+            for attr, points in weights.items():
+                offset = ATTRIBUTE_OFFSETS[_COLUMNS[attr]]
+                for value, score in points.items():
+                    self.table[i, offset + VALUE_CODES[attr][value]] += score
 
-    fabric_upper = outfit.get("fabric_upper")
-    fabric_lower = outfit.get("fabric_lower")
-    fabric_outer = outfit.get("fabric_outer")
+    def group(self, name: Optional[str]):
+        """Index of the rule group covering a season/occasion name, or None."""
+        return self.groups.get(name.lower()) if name else None
 
-    pattern_upper = outfit.get("pattern_upper")
-    pattern_lower = outfit.get("pattern_lower")
-    pattern_outer = outfit.get("pattern_outer")
+    def row(self, name: Optional[str]):
+        """Compiled table row for a season/occasion name, or None if no rule covers it."""
+        group = self.group(name)
+        return None if group is None else self.table[group]
 
-    sleeve_length = outfit.get("sleeve_length")
-    outer = outfit.get("outer")
-    covers_navel = outfit.get("covers_navel")
+    def score(self, outfit: Dict[str, Any], name: Optional[str]) -> float:
+        """Score of one outfit (an Outfit, or a dict of decoded values or integer codes)."""
+        row = self.row(name)
+        if row is None:
+            return 0.0
+        codes = getattr(outfit, 'codes', None)
+        if codes is None:
+            codes = [_code(attr, outfit.get(attr), col) for col, attr in enumerate(ATTRIBUTE_NAMES)]
+        return float(row[np.frombuffer(bytes(codes), dtype=np.uint8) + ATTRIBUTE_OFFSETS].sum())
 
-    # Summer: prefer light fabrics (cotton, chiffon), floral or pure colors, short sleeves, less outerwear
-    if season in ["summer", "hot"]:
-        if fabric_upper in [1, 5]:  # cotton, chiffon
-            score += 2.0
-        if fabric_lower in [1, 5]:
-            score += 1.0
-        if pattern_upper in [0, 3]:  # floral, pure color
-            score += 1.5
-        if pattern_lower in [0, 3]:
-            score += 0.5
-        if sleeve_length in [0, 1]:  # sleeveless, short sleeve
-            score += 2.0
-        if outer == 1:  # No outerwear
-            score += 1.0
-        if covers_navel == 1:
-            score += 0.5
 
-    # Winter: prefer warm fabrics (furry, knitted, leather), dark colors, long sleeves, outerwear like cardigan
-    elif season in ["winter", "cold"]:
-        if fabric_upper in [2, 3, 4]:  # leather, furry, knitted
-            score += 2.5
-        if fabric_outer in [2, 3, 4]:
-            score += 1.5
-        if sleeve_length == 3:  # long sleeve
-            score += 2.0
-        if outer == 0:  # cardigan
-            score += 2.0
-        if pattern_upper == 3:  # pure color (often darker)
-            score += 1.0
+def _code(attr, value, col):
+    if isinstance(value, int):
+        return value
+    return VALUE_CODES[attr].get(value, int(NA_CODES[col]))
 
-    # Spring: prefer light fabrics, medium sleeves, floral patterns, some layering allowed
-    elif season == "spring":
-        if fabric_upper in [1, 5]:
-            score += 1.5
-        if pattern_upper == 0:  # floral
-            score += 2.0
-        if sleeve_length == 2:  # medium sleeve
-            score += 1.5
-        if outer in [0, 1]:  # cardigan or no outerwear
-            score += 1.0
 
-    # Fall / Autumn: warmer fabrics but lighter than winter, layering with cardigan, warm colors
-    elif season in ["fall", "autumn"]:
-        if fabric_upper in [1, 2, 4]:  # cotton, leather, knitted
-            score += 2.0
-        if outer == 0:
-            score += 2.0
-        if sleeve_length in [2, 3]:  # medium or long sleeves
-            score += 1.5
-        if pattern_upper in [4, 6]:  # lattice or color block (warm tones)
-            score += 1.0
-
-    # Rainy or Dry seasons: prefer water-resistant fabrics (leather), minimal outerwear
-    elif season == "rainy":
-        if fabric_upper == 2:  # leather
-            score += 2.0
-        if outer == 1:  # no outerwear (to avoid getting wet)
-            score += 1.0
-
-    elif season == "dry":
-        if fabric_upper in [1, 5]:
-            score += 1.5
-        if outer == 1:
-            score += 1.0
-
-    return score
+SEASON_TABLE = RuleTable(SEASON_RULES)
+OCCASION_TABLE = RuleTable(OCCASION_RULES)
+
+
+def heuristic_season_score(outfit: Dict[str, Any], season: Optional[str]) -> float:
+    """
+    Assign heuristic scores to outfits based on the season.
+    Args:
+        outfit: dict of outfit attributes, keys are attribute names and values are codes or values
+        season: target season string (e.g., 'summer', 'winter', 'spring', 'fall')
+    Returns:
+        float score based on matching season heuristics (see SEASON_RULES)
+    """
+    return SEASON_TABLE.score(outfit, season)
+
 
 def heuristic_occasion_score(outfit: Dict[str, Any], occasion: Optional[str]) -> float:
     """
@@ -101,81 +153,6 @@ def heuristic_occasion_score(outfit: Dict[str, Any], occasion: Optional[str]) ->
         outfit: dict of outfit attributes
         occasion: occasion string (e.g., 'wedding', 'party', 'gym', 'work')
     Returns:
-        float score based on matching occasion heuristics
+        float score based on matching occasion heuristics (see OCCASION_RULES)
     """
-    if not occasion:
-        return 0.0
-
-    occasion = occasion.lower()
-    score = 0.0
-
-    sleeve_length = outfit.get("sleeve_length")
-    outer = outfit.get("outer")
-    socks = outfit.get("socks")
-    hat = outfit.get("hat")
-    glasses = outfit.get("glasses")
-    neckwear = outfit.get("neckwear")
-    waist_acc = outfit.get("waist_acc")
-    fabric_upper = outfit.get("fabric_upper")
-
-    # Formal occasions: wedding, party, ceremony, interview, work, business, meeting
-    if occasion in [
-        "wedding", "party", "ceremony", "interview", "work", "office",
-        "business", "meeting", "graduation"
-    ]:
-        if outer == 0:  # cardigan or similar outerwear is good for formal
-            score += 2.0
-        if sleeve_length == 3:  # long sleeves preferred
-            score += 1.5
-        if neckwear == 1:
-            score += 1.0
-        if waist_acc in [1, 2]:  # belt or clothing accessory
-            score += 1.0
-        if fabric_upper in [2, 1]:  # leather or cotton fabrics considered formal
-            score += 1.0
-        if glasses in [1, 2]:  # eyeglasses or sunglasses can add style points
-            score += 0.5
-
-    # Casual occasions: casual, holiday, vacation, picnic, date
-    elif occasion in ["casual", "holiday", "vacation", "picnic", "date"]:
-        if sleeve_length in [0, 1, 2]:  # sleeveless to medium sleeves
-            score += 1.5
-        if outer == 1:  # no outerwear preferred
-            score += 1.0
-        if hat == 1:
-            score += 0.5
-        if socks == 0:
-            score += 0.5
-
-    # Sport or gym occasions
-    elif occasion in ["sport", "gym"]:
-        if socks == 1:
-            score += 2.0
-        if sleeve_length in [0, 1]:
-            score += 1.5
-        if fabric_upper in [1, 6]:  # cotton or other flexible fabrics
-            score += 1.0
-        if waist_acc == 1:
-            score += 0.5  # belt might be used in sportswear
-
-    # Office or business casual
-    elif occasion in ["office", "business", "work"]:
-        if outer in [0, 1]:  # cardigan or no outerwear
-            score += 1.5
-        if sleeve_length in [2, 3]:  # medium or long sleeves
-            score += 1.5
-        if waist_acc in [1, 2]:
-            score += 1.0
-        if neckwear == 1:
-            score += 1.0
-
-    # Party or festive
-    elif occasion == "party":
-        if pattern_upper in [1, 6]:  # graphic or color block
-            score += 1.5
-        if sleeve_length in [0, 1]:
-            score += 1.0
-        if waist_acc == 1:
-            score += 0.5
-
-    return score
+    return OCCASION_TABLE.score(outfit, occasion)
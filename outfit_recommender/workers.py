@@ -0,0 +1,254 @@
+"""
+Process pool for CPU-bound scoring.
+
+Every worker process builds its own ScoreEngine, ScoreTables and AttributeIndex once,
+in the pool initializer: from the catalog's snapshot file when it has one (memory-
+mapped, so workers share its pages), otherwise from arrays pickled to the worker at
+start-up. Requests are then shipped as small dicts, with the prompt already parsed by
+the server process when it has been (workers have prompt caches of their own, which
+then stay out of the way), and results come back as lists, together with the
+worker's stage timings, which are recorded in the server process.
+Weight profiles are compiled in every worker too: those known when the pool starts
+in the initializer, later ones when register_profile() warms the workers (or on a
+worker's first request naming them), so requests only ship the profile's weights.
+
+ScoringPool runs each request in one worker over the whole catalog.
+ShardedScoringPool splits the catalog into contiguous row ranges, one per worker.
+Every request then runs in all workers at once, and the local top-k lists are merged
+(diversity re-ranking, when asked for, runs once on the merged shortlist).
+"""
+import asyncio
+import heapq
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from . import metrics
+from .catalog import Catalog
+from .diversity import diversify, shortlist_size
+from .engine import ScoreEngine
+from .index import AttributeIndex
+from .precompute import ScoreTables
+from .profiles import DEFAULT_PROFILE, WeightProfile, profile_name, recommend_batch_by_profile, weights_key
+from .recommender import recommend_request
+
+# (engine, tables, index) of this worker process
+_state = None
+# (style_score_map, bodyshape_score_map) the worker's weight profiles are compiled from
+_score_maps = None
+# Weight profile name -> {weights key: WeightProfile} compiled in this worker
+_profiles = {}
+
+
+def _plain(score_map: dict) -> dict:
+    # Score maps are nested defaultdicts with lambdas, which cannot be pickled
+    return {attr: {value: dict(cols) for value, cols in by_value.items()} for attr, by_value in score_map.items()}
+
+
+def _init_worker(catalog_source, style_score_map, bodyshape_score_map, attr_weights, shard=None, profiles=None):
+    # `shard` is an optional (start, stop) row range this worker is restricted to
+    global _state, _score_maps
+    if isinstance(catalog_source, str):
+        catalog = Catalog.attach(catalog_source)
+    else:
+        catalog = Catalog(catalog_source)
+    if shard is not None:
+        catalog = catalog.slice(*shard)
+    weights = defaultdict(lambda: 1.0, attr_weights)
+    engine = ScoreEngine(catalog, style_score_map, bodyshape_score_map, weights)
+    _state = (engine, ScoreTables(engine), AttributeIndex(catalog))
+    _score_maps = (style_score_map, bodyshape_score_map)
+    for name, profile_weights in (profiles or {}).items():
+        _register_profile(name, profile_weights)
+    # /metrics is served by the parent; observations travel back with each result
+    metrics.forward()
+
+
+def _ready():
+    return _state is not None
+
+
+def _register_profile(name, weights):
+    compiled = _profiles.setdefault(name, {})
+    key = weights_key(weights)
+    if key not in compiled:
+        compiled[key] = WeightProfile.compile(name, weights, _state[0], *_score_maps)
+        # The weights being replaced stay compiled too: requests on the state that is
+        # being swapped out still send them
+        while len(compiled) > 2:
+            del compiled[next(iter(compiled))]
+    return compiled[key]
+
+
+def _scoring(name, profiles):
+    # (engine, tables) for a weight profile; `profiles` holds the weights of every
+    # non-default profile in the request, compiled here first if they are new
+    if name == DEFAULT_PROFILE:
+        return _state[:2]
+    profile = _register_profile(name, profiles[name])
+    return profile.engine, profile.tables
+
+
+def _recommend(request, default_style, profiles=None, parsed=None):
+    engine, tables = _scoring(profile_name(request), profiles)
+    return recommend_request(engine, tables, _state[2], request, default_style, parsed), metrics.take()
+
+
+def _recommend_batch(requests, default_style, profiles=None, parsed=None):
+    engine_for = lambda name: _scoring(name, profiles)[0]
+    return recommend_batch_by_profile(requests, engine_for, _state[2], default_style, parsed), metrics.take()
+
+
+def _warm_profile(name, weights):
+    _register_profile(name, weights)
+    return True
+
+
+def _drop_profile(name):
+    _profiles.pop(name, None)
+    return True
+
+
+class ScoringPool:
+    """
+    Bounded pool of `max_workers` scoring processes for one catalog. The async
+    methods hand work to the pool, so the event loop is never blocked by scoring.
+    """
+
+    def __init__(self, catalog, style_score_map, bodyshape_score_map, attr_weights=None, max_workers=2,
+                 profiles=None):
+        self.max_workers = max_workers
+        self._executor = _executor(catalog, style_score_map, bodyshape_score_map, attr_weights, max_workers, profiles=profiles)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def start(self):
+        """Starts the workers and waits until each has built its scoring state."""
+        await asyncio.gather(*(self._run(_ready) for _ in range(self.max_workers)))
+
+    async def register_profile(self, name: str, weights: dict):
+        """
+        Compiles weight profile `name` in the workers ahead of the first request
+        using it. One job per worker; a worker that misses it compiles on first use.
+        """
+        await asyncio.gather(*(self._run(_warm_profile, name, weights) for _ in range(self.max_workers)))
+
+    async def drop_profile(self, name: str):
+        """Frees weight profile `name` in the workers, the same way."""
+        await asyncio.gather(*(self._run(_drop_profile, name) for _ in range(self.max_workers)))
+
+    async def recommend(self, request: dict, default_style: str = "Casual", profiles=None, parsed=None) -> list:
+        """
+        recommend_request for one request dict, run in a worker. `profiles` maps
+        the non-default weight profile the request names to its weights; `parsed`
+        is the prompt's parse, if already done here.
+        """
+        return _replayed(await self._run(_recommend, request, default_style, profiles, parsed))
+
+    async def recommend_batch(self, requests: list, default_style: str = "Casual", profiles=None, parsed=None) -> list:
+        """recommend_batch for a list of request dicts, run in a worker."""
+        return _replayed(await self._run(_recommend_batch, requests, default_style, profiles, parsed))
+
+    def shutdown(self, wait: bool = False):
+        """Stops the workers; with `wait`, work already submitted finishes first."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+class ShardedScoringPool:
+    """
+    One scoring process per contiguous shard of the catalog. A request is scored in
+    every shard in parallel and the shards' top-k lists are merged, so one request
+    uses all `shards` cores. Results are the same as scoring the whole catalog.
+    """
+
+    def __init__(self, catalog, style_score_map, bodyshape_score_map, attr_weights=None, shards=2, profiles=None):
+        shards = max(1, min(shards, len(catalog)))
+        self.bounds = [len(catalog) * i // shards for i in range(shards + 1)]
+        self._executors = [
+            _executor(catalog, style_score_map, bodyshape_score_map, attr_weights, 1, (start, stop), profiles)
+            for start, stop in zip(self.bounds, self.bounds[1:])
+        ]
+
+    async def _run_all(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(ex, fn, *args) for ex in self._executors))
+
+    async def start(self):
+        """Starts every shard and waits until each has built its scoring state."""
+        await self._run_all(_ready)
+
+    async def register_profile(self, name: str, weights: dict):
+        """Compiles weight profile `name` in every shard ahead of the first request using it."""
+        await self._run_all(_warm_profile, name, weights)
+
+    async def drop_profile(self, name: str):
+        """Frees weight profile `name` in every shard."""
+        await self._run_all(_drop_profile, name)
+
+    async def recommend(self, request: dict, default_style: str = "Casual", profiles=None, parsed=None) -> list:
+        """recommend_request for one request dict, scored across all shards."""
+        answers = await self._run_all(_recommend, _shard_request(request), default_style, profiles, parsed)
+        return _merged([_replayed(answer) for answer in answers], request)
+
+    async def recommend_batch(self, requests: list, default_style: str = "Casual", profiles=None, parsed=None) -> list:
+        """recommend_batch for a list of request dicts, scored across all shards."""
+        shard_requests = [_shard_request(r) for r in requests]
+        answers = await self._run_all(_recommend_batch, shard_requests, default_style, profiles, parsed)
+        per_shard = [_replayed(answer) for answer in answers]
+        return [_merged(results, r) for r, results in zip(requests, zip(*per_shard))]
+
+    def shutdown(self, wait: bool = False):
+        """Stops the shards; with `wait`, work already submitted finishes first."""
+        for ex in self._executors:
+            ex.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def _replayed(answer):
+    # (results, observations) from a worker; stage timings of every shard are recorded
+    results, observations = answer
+    metrics.replay(observations)
+    return results
+
+
+def _shard_request(request):
+    # Shards return their best shortlist by score; diversity needs the merged one
+    if not request.get('diversity'):
+        return request
+    return dict(request, topk=shortlist_size(request.get('topk', 3)), diversity=0.0)
+
+
+def _merged(per_shard, request):
+    topk = request.get('topk', 3)
+    diversity = request.get('diversity', 0.0)
+    if not diversity:
+        return _merge(per_shard, topk)
+    return diversify(_merge(per_shard, shortlist_size(topk)), topk, diversity)
+
+
+def _merge(per_shard, topk):
+    # Each shard's list is sorted by score, ties in row order, and shards hold
+    # ascending row ranges; merge() keeps earlier shards first on ties, which is
+    # exactly the order a single pass over the catalog produces
+    merged = heapq.merge(*per_shard, key=lambda result: -result['score'])
+    return [result for result, _ in zip(merged, range(topk))]
+
+
+def _executor(catalog, style_score_map, bodyshape_score_map, attr_weights, max_workers, shard=None, profiles=None):
+    if catalog.path:
+        # Workers attach the shared snapshot file and slice their shard from it
+        catalog_source = catalog.path
+    else:
+        if shard is not None:
+            catalog, shard = catalog.slice(*shard), None
+        catalog_source = catalog.arrays()
+    # Spawned, not forked: the parent runs an event loop and background threads
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(
+            catalog_source, _plain(style_score_map), _plain(bodyshape_score_map), dict(attr_weights or {}), shard,
+            dict(profiles or {}),
+        ),
+    )